@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Mack Stone
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+# Polygon mesh held in numpy arrays, pulled from a MFnMesh in one go and
+# usable without Maya. MeshData answers the MFnMesh calls uvOverlap.py,
+# reverseNormalFaces.py, uvPacker.py and uvLint.py make, so they all run on
+# the same arrays.
+#
+# how to use:
+#
+# import meshData
+# import uvLint
+#
+# mesh = meshData.getMeshData('pSphere1')
+# report = uvLint.lintUVs(mesh)
+#
+# # outside Maya
+# np.savez('pSphere1.npz', **mesh.arrays())
+# mesh = meshData.MeshData(**np.load('pSphere1.npz'))
+#
+# # back into Maya, as a new mesh or onto one with the same topology
+# meshfn = mesh.toMFnMesh()
+# mesh.toMFnMesh(om.MFnMesh(dagPath))
+
+import numpy as np
+try:
+    import maya.api.OpenMaya as om
+except ImportError:
+    om = None
+
+import uvOverlap
+
+
+def _vectorArray(array, dtype):
+    """Return (n, 3) copy of a MPointArray, MFloatVectorArray or (n, 3)
+    array, dropping w."""
+    a = np.array(array, dtype=dtype)
+    if a.size == 0:
+        return np.zeros((0, 3), dtype=dtype)
+    return a.reshape(-1, a.shape[-1])[:, :3]
+
+class MeshData(object):
+    """Polygon mesh in numpy arrays
+    points          - float64 (n, 3) vertex positions
+    counts          - number of vertices of each face
+    connects        - vertex id of every face-vertex, face after face
+    u, v            - float32 uv coordinates indexed by uv id
+    uvCounts, uvIds - number of uvs assigned to each face, 0 if unmapped, and
+                      uv id of every face-vertex, see MFnMesh.getAssignedUVs
+    normals         - float32 (n, 3) normals indexed by normal id, or None
+    normalIds       - normal id of every face-vertex, or None
+    worldSpace      - points and normals are in world space
+
+    Arrays given with the right dtype are kept as they are, not copied. The
+    API 2.0 arrays don't expose their buffer, so fromMFnMesh has to copy them
+    once."""
+    __slots__ = ('_name', 'points', 'counts', 'connects', 'u', 'v', 'uvCounts', 'uvIds',
+                 'normals', 'normalIds', 'worldSpace')
+
+    def __init__(self, points, counts, connects, u=None, v=None, uvCounts=None,
+                 uvIds=None, normals=None, normalIds=None, name='meshData', worldSpace=True):
+        self._name = str(name)
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.connects = np.asarray(connects, dtype=np.int64)
+        self.u = np.asarray(() if u is None else u, dtype=np.float32)
+        self.v = np.asarray(() if v is None else v, dtype=np.float32)
+        if uvCounts is None:
+            uvCounts = np.zeros(len(self.counts), dtype=np.int64)
+        self.uvCounts = np.asarray(uvCounts, dtype=np.int64)
+        self.uvIds = np.asarray(() if uvIds is None else uvIds, dtype=np.int64)
+        self.normals = None
+        self.normalIds = None
+        if normals is not None:
+            self.normals = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+            self.normalIds = np.asarray(normalIds, dtype=np.int64)
+        self.worldSpace = bool(worldSpace)
+
+    @classmethod
+    def fromMFnMesh(cls, meshfn, uvSet='', worldSpace=True, normals=True):
+        """Pull points, faces, the uvs of uvSet and, if normals is true, the
+        face-vertex normals of meshfn, one API call for each array."""
+        space = om.MSpace.kWorld if worldSpace else om.MSpace.kObject
+        counts, connects = meshfn.getVertices()
+        u, v = meshfn.getUVs(uvSet)
+        uvCounts, uvIds = meshfn.getAssignedUVs(uvSet)
+        normalArray = normalIds = None
+        if normals:
+            normalArray = _vectorArray(meshfn.getNormals(space), np.float32)
+            normalIds = meshfn.getNormalIds()[1]
+        return cls(_vectorArray(meshfn.getPoints(space), np.float64), counts, connects,
+                   u, v, uvCounts, uvIds, normalArray, normalIds, meshfn.name(), worldSpace)
+
+    def toMFnMesh(self, meshfn=None, parent=None, uvSet='', normals=False):
+        """Write the arrays to Maya. Without meshfn a new mesh is created
+        under parent, otherwise points and uvs of meshfn, which must have the
+        same number of vertices and faces, are replaced. Normals are only
+        set, and locked, if normals is true.
+
+        return MFnMesh"""
+        space = om.MSpace.kWorld if self.worldSpace else om.MSpace.kObject
+        points = om.MPointArray(self.points.tolist())
+        if meshfn is None:
+            meshfn = om.MFnMesh()
+            meshfn.create(points, self.counts.tolist(), self.connects.tolist(),
+                          parent=om.MObject.kNullObj if parent is None else parent)
+        else:
+            if (meshfn.numVertices != len(self.points) or
+                    meshfn.numPolygons != len(self.counts)):
+                raise ValueError("Mesh %s doesn't match the topology of %s"
+                                 % (meshfn.name(), self._name))
+            meshfn.setPoints(points, space)
+            meshfn.clearUVs(uvSet)
+        if len(self.u):
+            meshfn.setUVs(self.u.tolist(), self.v.tolist(), uvSet)
+            meshfn.assignUVs(self.uvCounts.tolist(), self.uvIds.tolist(), uvSet)
+        if normals and self.normals is not None:
+            faces = np.repeat(np.arange(len(self.counts)), self.counts)
+            meshfn.setFaceVertexNormals(om.MVectorArray(self.normals[self.normalIds].tolist()),
+                                        faces.tolist(), self.connects.tolist(), space)
+        return meshfn
+
+    def arrays(self):
+        """Return dict of the constructor arguments, i.e. to np.savez them."""
+        arrays = dict(points=self.points, counts=self.counts, connects=self.connects,
+                      u=self.u, v=self.v, uvCounts=self.uvCounts, uvIds=self.uvIds,
+                      name=self._name, worldSpace=self.worldSpace)
+        if self.normals is not None:
+            arrays.update(normals=self.normals, normalIds=self.normalIds)
+        return arrays
+
+    # MFnMesh calls the tools make, MeshData holds one uv set and one space
+    # so uvSet and space are ignored
+    def name(self):
+        return self._name
+
+    @property
+    def numPolygons(self):
+        return len(self.counts)
+
+    @property
+    def numVertices(self):
+        return len(self.points)
+
+    def numUVs(self, uvSet=''):
+        return len(self.u)
+
+    def getPoints(self, space=None):
+        return self.points
+
+    def getVertices(self):
+        return self.counts, self.connects
+
+    def getUVs(self, uvSet=''):
+        return self.u, self.v
+
+    def getUV(self, uvId, uvSet=''):
+        return float(self.u[uvId]), float(self.v[uvId])
+
+    def getAssignedUVs(self, uvSet=''):
+        return self.uvCounts, self.uvIds
+
+    def getNormals(self, space=None):
+        return self.normals
+
+    def getNormalIds(self):
+        return self.counts, self.normalIds
+
+    def setUVs(self, uArray, vArray, uvSet=''):
+        self.u = np.asarray(uArray, dtype=np.float32)
+        self.v = np.asarray(vArray, dtype=np.float32)
+
+    def assignUVs(self, uvCounts, uvIds, uvSet=''):
+        self.uvCounts = np.asarray(uvCounts, dtype=np.int64)
+        self.uvIds = np.asarray(uvIds, dtype=np.int64)
+
+    def clearUVs(self, uvSet=''):
+        self.u = np.zeros(0, dtype=np.float32)
+        self.v = np.zeros(0, dtype=np.float32)
+        self.uvCounts = np.zeros(len(self.counts), dtype=np.int64)
+        self.uvIds = np.zeros(0, dtype=np.int64)
+
+def getMeshData(meshName, uvSet='', worldSpace=True, normals=True):
+    """Return MeshData of given mesh or transform name, see
+    MeshData.fromMFnMesh"""
+    return MeshData.fromMFnMesh(uvOverlap.getMeshFn(meshName), uvSet, worldSpace, normals)
@@ -0,0 +1,145 @@
+# --------------------------------------------------------------------------------
+# Copyright (c) 2014 Mack Stone. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# --------------------------------------------------------------------------------
+
+"""
+uvFlipRepair command, mirrors the uvs of all reversed faces of a mesh at once
+with reverseNormalFaces.flipUVData, one setUVs(and one assignUVs when faces
+get uvs of their own) instead of a polyFlipUV per face. One undo puts all the
+old uvs back.
+
+Edits go straight to the mesh data, on meshes with construction history
+they last until the history is evaluated again, delete history first.
+
+reverseNormalFaces.py and uvOverlap.py have to be on the python path.
+
+from maya import cmds
+cmds.loadPlugin('uvFlipRepairCmd.py')
+faces = cmds.uvFlipRepair('pSphere1')
+faces = cmds.uvFlipRepair('pSphere1', mode='face')
+
+@author: Mack Stone
+"""
+
+import sys
+
+import maya.api.OpenMaya as om
+
+import numpy as np
+
+import uvOverlap
+import reverseNormalFaces
+
+
+def maya_useNewAPI():
+    """
+    The presence of this function tells Maya that the plugin produces, and
+    expects to be passed, objects created using the Maya Python API 2.0.
+    """
+    pass
+
+
+class UVFlipRepairCmd(om.MPxCommand):
+    kPluginCmdName = 'uvFlipRepair'
+
+    kModeFlag = '-m'
+    kModeLongFlag = '-mode'
+    kUVSetFlag = '-uvs'
+    kUVSetLongFlag = '-uvSet'
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.meshfn = None
+        self.uvSet = ''
+        self.oldUVs = None
+        self.newUVs = None
+
+    @staticmethod
+    def cmdCreator():
+        return UVFlipRepairCmd()
+
+    @staticmethod
+    def syntaxCreator():
+        syntax = om.MSyntax()
+        syntax.addFlag(UVFlipRepairCmd.kModeFlag, UVFlipRepairCmd.kModeLongFlag,
+                       om.MSyntax.kString)
+        syntax.addFlag(UVFlipRepairCmd.kUVSetFlag, UVFlipRepairCmd.kUVSetLongFlag,
+                       om.MSyntax.kString)
+        syntax.setObjectType(om.MSyntax.kSelectionList, 1, 1)
+        syntax.useSelectionAsDefault(True)
+        syntax.enableQuery = False
+        syntax.enableEdit = False
+        return syntax
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        argData = om.MArgDatabase(self.syntax(), args)
+        mode = 'auto'
+        if argData.isFlagSet(self.kModeFlag):
+            mode = argData.flagArgumentString(self.kModeFlag, 0)
+        if mode not in ('auto', 'shell', 'face'):
+            raise ValueError("mode has to be 'auto', 'shell' or 'face'")
+        if argData.isFlagSet(self.kUVSetFlag):
+            self.uvSet = argData.flagArgumentString(self.kUVSetFlag, 0)
+        self.meshfn = uvOverlap.getMeshFn(argData.getObjectList().getDagPath(0))
+
+        data = uvOverlap.extractUVFaceData(self.meshfn, self.uvSet)
+        faces = reverseNormalFaces.reverseNormalFaceIds(data)
+        if len(faces):
+            u, v, uvCounts, uvIds, left = reverseNormalFaces.flipUVData(data, faces, mode)
+            faces = np.setdiff1d(faces, left)
+            if np.array_equal(uvIds, data.uvIds):
+                # only moved uvs, same assignment
+                self.oldUVs = (data.u, data.v)
+                self.newUVs = (u, v)
+            else:
+                self.oldUVs = (data.u, data.v, data.counts, data.uvIds)
+                self.newUVs = (u, v, uvCounts, uvIds)
+            self.redoIt()
+        self.setResult(uvOverlap.faceComponentNames(self.meshfn.name(), faces))
+
+    def redoIt(self):
+        if self.newUVs is not None:
+            reverseNormalFaces.setUVData(self.meshfn, *self.newUVs, uvSet=self.uvSet)
+
+    def undoIt(self):
+        if self.oldUVs is not None:
+            reverseNormalFaces.setUVData(self.meshfn, *self.oldUVs, uvSet=self.uvSet)
+
+
+def initializePlugin(obj):
+    plugin = om.MFnPlugin(obj, 'Mack Stone', '1.0', 'Any')
+    try:
+        plugin.registerCommand(UVFlipRepairCmd.kPluginCmdName, UVFlipRepairCmd.cmdCreator,
+                               UVFlipRepairCmd.syntaxCreator)
+    except:
+        sys.stderr.write("Failed to register command: %s\n" % UVFlipRepairCmd.kPluginCmdName)
+        raise
+
+def uninitializePlugin(obj):
+    plugin = om.MFnPlugin(obj)
+    try:
+        plugin.deregisterCommand(UVFlipRepairCmd.kPluginCmdName)
+    except:
+        sys.stderr.write("Failed to unregister command: %s\n" % UVFlipRepairCmd.kPluginCmdName)
+        raise
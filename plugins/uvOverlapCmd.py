@@ -0,0 +1,205 @@
+# --------------------------------------------------------------------------------
+# Copyright (c) 2014 Mack Stone. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# --------------------------------------------------------------------------------
+
+"""
+uvOverlap command, checks the uvs of a mesh for overlaps with uvOverlap.py on
+a worker thread while Maya shows a progress bar, ESC stops the check. The
+overlapping faces get selected, undo brings the old selection back.
+
+uvOverlap.py has to be on the python path.
+
+from maya import cmds
+cmds.loadPlugin('uvOverlapCmd.py')
+faces = cmds.uvOverlap('pSphere1')
+faces = cmds.uvOverlap('pSphere1', cullNeighbours=True, stacked=True)
+
+@author: Mack Stone
+"""
+
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import maya.api.OpenMaya as om
+
+import numpy as np
+
+import uvOverlap
+
+
+def maya_useNewAPI():
+    """
+    The presence of this function tells Maya that the plugin produces, and
+    expects to be passed, objects created using the Maya Python API 2.0.
+    """
+    pass
+
+
+class UVOverlapCmd(om.MPxCommand):
+    """Mesh data is pulled through the API on the main thread, only numpy
+    runs on the worker thread. The main thread stays in doIt polling the
+    worker, MComputation keeps the progress bar drawn and catches ESC,
+    numpy releasing the GIL in its loops lets both threads run."""
+    kPluginCmdName = 'uvOverlap'
+
+    kCullNeighboursFlag = '-cn'
+    kCullNeighboursLongFlag = '-cullNeighbours'
+    kStackedFlag = '-st'
+    kStackedLongFlag = '-stacked'
+    kBatchSizeFlag = '-bs'
+    kBatchSizeLongFlag = '-batchSize'
+
+    # seconds between two interrupt checks
+    pollInterval = 0.1
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.oldSelection = None
+        self.newSelection = None
+
+    @staticmethod
+    def cmdCreator():
+        return UVOverlapCmd()
+
+    @staticmethod
+    def syntaxCreator():
+        syntax = om.MSyntax()
+        syntax.addFlag(UVOverlapCmd.kCullNeighboursFlag, UVOverlapCmd.kCullNeighboursLongFlag,
+                       om.MSyntax.kBoolean)
+        syntax.addFlag(UVOverlapCmd.kStackedFlag, UVOverlapCmd.kStackedLongFlag,
+                       om.MSyntax.kBoolean)
+        syntax.addFlag(UVOverlapCmd.kBatchSizeFlag, UVOverlapCmd.kBatchSizeLongFlag,
+                       om.MSyntax.kLong)
+        syntax.setObjectType(om.MSyntax.kSelectionList, 1, 1)
+        syntax.useSelectionAsDefault(True)
+        syntax.enableQuery = False
+        syntax.enableEdit = False
+        return syntax
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        argData = om.MArgDatabase(self.syntax(), args)
+        cullNeighbours = (argData.isFlagSet(self.kCullNeighboursFlag) and
+                          argData.flagArgumentBool(self.kCullNeighboursFlag, 0))
+        stacked = (argData.isFlagSet(self.kStackedFlag) and
+                   argData.flagArgumentBool(self.kStackedFlag, 0))
+        batchSize = None
+        if argData.isFlagSet(self.kBatchSizeFlag):
+            batchSize = argData.flagArgumentInt(self.kBatchSizeFlag, 0)
+        objects = argData.getObjectList()
+        meshfn = uvOverlap.getMeshFn(objects.getDagPath(0))
+
+        # API calls stay on the main thread
+        data = uvOverlap.extractUVFaceData(meshfn)
+        pairs, interrupted = self.runCheck(data, batchSize, cullNeighbours, stacked)
+
+        faces = np.unique(pairs)
+        self.oldSelection = om.MGlobal.getActiveSelectionList()
+        self.newSelection = uvOverlap.faceSelection(meshfn, faces)
+        if interrupted:
+            om.MGlobal.displayWarning('uvOverlap interrupted, %d overlapping faces '
+                                      'found so far' % len(faces))
+        self.redoIt()
+        self.setResult(uvOverlap.faceComponentNames(meshfn.name(), faces))
+
+    def runCheck(self, data, batchSize, cullNeighbours, stacked):
+        """Run iterOverlapPairs on a worker thread, showing its progress.
+
+        return (overlapping pairs found, True if the user interrupted)"""
+        results = queue.Queue()
+        stop = threading.Event()
+
+        def work():
+            try:
+                for pairs, progress in uvOverlap.iterOverlapPairs(
+                        data, batchSize=batchSize, cancel=stop.is_set,
+                        cullNeighbours=cullNeighbours, stacked=stacked):
+                    results.put(('batch', pairs, progress))
+            except Exception as e:
+                results.put(('error', e))
+            results.put(('done',))
+
+        worker = threading.Thread(target=work, name='uvOverlapWorker')
+        worker.daemon = True
+        computation = om.MComputation()
+        computation.beginComputation(True, True)
+        computation.setProgressRange(0, 100)
+        found = []
+        interrupted = False
+        try:
+            worker.start()
+            while True:
+                if computation.isInterruptRequested():
+                    interrupted = True
+                    stop.set()
+                    break
+                try:
+                    result = results.get(timeout=self.pollInterval)
+                except queue.Empty:
+                    continue
+                if result[0] == 'done':
+                    break
+                if result[0] == 'error':
+                    raise result[1]
+                found.append(result[1])
+                computation.setProgress(int(result[2] * 100))
+        finally:
+            stop.set()
+            worker.join()
+            computation.endComputation()
+        # a batch finished while stopping
+        while not results.empty():
+            result = results.get()
+            if result[0] == 'batch':
+                found.append(result[1])
+        pairs = np.concatenate(found) if found else np.zeros((0, 2), np.int64)
+        return pairs, interrupted
+
+    def redoIt(self):
+        om.MGlobal.setActiveSelectionList(self.newSelection)
+
+    def undoIt(self):
+        om.MGlobal.setActiveSelectionList(self.oldSelection)
+
+
+def initializePlugin(obj):
+    plugin = om.MFnPlugin(obj, 'Mack Stone', '1.0', 'Any')
+    try:
+        plugin.registerCommand(UVOverlapCmd.kPluginCmdName, UVOverlapCmd.cmdCreator,
+                               UVOverlapCmd.syntaxCreator)
+    except:
+        sys.stderr.write("Failed to register command: %s\n" % UVOverlapCmd.kPluginCmdName)
+        raise
+
+def uninitializePlugin(obj):
+    plugin = om.MFnPlugin(obj)
+    try:
+        plugin.deregisterCommand(UVOverlapCmd.kPluginCmdName)
+    except:
+        sys.stderr.write("Failed to unregister command: %s\n" % UVOverlapCmd.kPluginCmdName)
+        raise
@@ -25,35 +25,176 @@
 #
 # faces = getReversNormalFaces("pSphereShape1")
 # cmds.select(faces, r=1)
+#
+# or get face ids as an array
+# faceIds = getReverseNormalFaceIds("pSphereShape1")
+#
+# classify whole uv shells, twisted faces inside a good shell don't count
+# faces = getReverseNormalFaces("pSphereShape1", shells=True)
+#
+# mirror the uvs of reversed faces in one go, see plugins/uvFlipRepairCmd.py
+# for the undoable command
+# faceIds, oldUVs = repairReverseNormalFaces("pSphereShape1")
+# setUVData(uvOverlap.getMeshFn("pSphereShape1"), *oldUVs)
+
+import numpy as np
+
+import uvOverlap
 
-import maya.api.OpenMaya as om
+def reverseNormalFaceIds(data):
+    """Vote on the winding of every face at once. Each face-vertex i votes
+    with the sign of the uv triangle (i, i + 1, i + 2), faces with more
+    clockwise than counter clockwise votes are reversed.
+    data - UVFaceData, see uvOverlap.extractUVFaceData
+    
+    return sorted ids of reversed faces"""
+    u = data.faceU.astype(np.float64)
+    v = data.faceV.astype(np.float64)
+    faceOf = data.faceIndices()
+    # position of every face-vertex inside its face
+    local = np.arange(len(faceOf)) - data.offsets[faceOf]
+    counts = data.counts[faceOf]
+    start = data.offsets[faceOf]
+    j = start + (local + 1) % counts
+    k = start + (local + 2) % counts
+    v1u = u[j] - u
+    v1v = v[j] - v
+    v2u = u[k] - u
+    v2v = v[k] - v
+    w = v1u * v2v - v1v * v2u
+    votes = np.bincount(faceOf, weights=np.sign(w), minlength=data.numFaces)
+    return np.flatnonzero(votes < 0)
+
+# faces of a shell disagreeing with it need at least this share of the mean
+# face area of the shell to count on their own
+SHELL_FLIP_AREA = 0.25
+
+def reverseNormalShells(data, shells=None):
+    """Classify whole uv shells by the sign of their summed uv area, then
+    check the faces of shells with faces of both signs in one more pass. A
+    face of such a mixed shell only goes against its shell when its area is
+    at least SHELL_FLIP_AREA of the shell's mean face area, so small twisted
+    faces follow their shell.
+    data - UVFaceData, see uvOverlap.extractUVFaceData
+    shells - (shell ids, number of shells) from uvOverlap.computeUVShells
+    
+    return (sorted ids of reversed faces, ids of reversed shells)"""
+    if shells is None:
+        shells = uvOverlap.computeUVShells(data)
+    shellOf, numShells = shells
+    mapped = np.flatnonzero(shellOf >= 0)
+    s = shellOf[mapped]
+    area = uvOverlap.faceAreas(data, mapped)
+    shellArea = np.bincount(s, weights=area, minlength=numShells)
+    shellReversed = shellArea < 0
+    
+    faceReversed = shellReversed[s]
+    against = (area < 0) != faceReversed
+    mixed = np.bincount(s, weights=against, minlength=numShells) > 0
+    inMixed = np.flatnonzero(mixed[s])
+    if len(inMixed):
+        sm = s[inMixed]
+        meanArea = (np.bincount(sm, weights=np.fabs(area[inMixed]), minlength=numShells) /
+                    np.maximum(np.bincount(sm, minlength=numShells), 1))
+        own = against[inMixed] & (np.fabs(area[inMixed]) >= SHELL_FLIP_AREA * meanArea[sm])
+        faceReversed[inMixed[own]] = ~faceReversed[inMixed[own]]
+    return mapped[faceReversed], np.flatnonzero(shellReversed)
 
-def getReverseNormalFaces(meshName):
+def getReverseNormalFaceIds(meshName, shells=False):
+    """Return ids of reverse normal faces of given polygon mesh, see
+    getReverseNormalFaces"""
+    meshfn = uvOverlap.getMeshFn(meshName)
+    data = uvOverlap.extractUVFaceData(meshfn)
+    if shells:
+        return reverseNormalShells(data)[0]
+    return reverseNormalFaceIds(data)
+
+def getReverseNormalFaces(meshName, shells=False):
     '''get reverse normal faces from given ploygon mesh base on uv projection.
-    If the uv projection was not correct you may get uncorrect result'''
-    revFaces = []
-    selList = om.MSelectionList()
-    selList.add(meshName)
-    mesh = om.MFnMesh(selList.getDependNode(0))
-    
-    for fid in range(mesh.numPolygons):
-        count = 0
-        numVert = len(mesh.getPolygonVertices(fid))
-        for i in range(numVert):
-            j = (i + 1) % numVert
-            k = (i + 2) % numVert
-            uv1 = mesh.getPolygonUV(fid, i)
-            uv2 = mesh.getPolygonUV(fid, j)
-            uv3 = mesh.getPolygonUV(fid, k)
-            v1 = om.MPoint(uv2[0], uv2[1]) - om.MPoint(uv1[0], uv1[1])
-            v2 = om.MPoint(uv3[0], uv3[1]) - om.MPoint(uv1[0], uv1[1])
-            w = v1 ^ v2
-            if w.z > 0:
-                count += 1
-            elif w.z < 0:
-                count -= 1
-                
-        if count < 0:
-            revFaces.append('%s.f[%i]' % (meshName, fid))
-            
-    return revFaces
\ No newline at end of file
+    If the uv projection was not correct you may get uncorrect result
+    shells - classify whole uv shells, see reverseNormalShells'''
+    return uvOverlap.faceNames(meshName, getReverseNormalFaceIds(meshName, shells))
+
+def flipUVData(data, faces=None, mode='auto'):
+    """Mirror uvs along u, around their own box, so reversed faces wind the
+    right way again.
+    faces - reversed faces, reverseNormalFaceIds(data) if None
+    mode  - 'shell' mirrors whole shells with more reversed than right faces,
+            'face' gives each reversed face uvs of its own, split from its
+            shell, and mirrors those,
+            'auto' mirrors shells first, then splits the faces left
+    Splitting faces renumbers the uvs, leaving out the ones no face uses.
+    
+    return (u, v, uvCounts, uvIds, ids of faces still reversed)"""
+    if faces is None:
+        faces = reverseNormalFaceIds(data)
+    faces = np.asarray(faces, dtype=np.int64)
+    u = data.u.astype(np.float64)
+    v = data.v.astype(np.float64)
+    uvIds = data.uvIds.copy()
+    
+    if mode in ('shell', 'auto') and len(faces):
+        shellOf, numShells = uvOverlap.computeUVShells(data)
+        reversedCount = np.bincount(shellOf[faces], minlength=numShells)
+        total = np.bincount(shellOf[shellOf >= 0], minlength=numShells)
+        mirror = reversedCount * 2 > total
+        uvShell = np.full(len(u), -1, dtype=np.int64)
+        uvShell[uvIds] = np.repeat(shellOf, data.counts)
+        moved = np.flatnonzero(uvShell >= 0)
+        moved = moved[mirror[uvShell[moved]]]
+        lo = np.full(numShells, np.inf)
+        hi = np.full(numShells, -np.inf)
+        np.minimum.at(lo, uvShell[moved], u[moved])
+        np.maximum.at(hi, uvShell[moved], u[moved])
+        u[moved] = lo[uvShell[moved]] + hi[uvShell[moved]] - u[moved]
+        faces = reverseNormalFaceIds(uvOverlap.UVFaceData(data.name, u, v, data.counts, uvIds))
+    
+    if mode in ('face', 'auto') and len(faces):
+        counts = data.counts[faces]
+        fvIds = uvOverlap._ranges(data.offsets[faces], counts)
+        faceU = u[uvIds[fvIds]]
+        faceV = v[uvIds[fvIds]]
+        starts = np.cumsum(counts) - counts
+        lo = np.repeat(np.minimum.reduceat(faceU, starts), counts)
+        hi = np.repeat(np.maximum.reduceat(faceU, starts), counts)
+        uvIds[fvIds] = len(u) + np.arange(len(fvIds))
+        u = np.concatenate((u, lo + hi - faceU))
+        v = np.concatenate((v, faceV))
+        # drop the uvs only the split faces used
+        used, uvIds = np.unique(uvIds, return_inverse=True)
+        uvIds = uvIds.reshape(-1)
+        u = u[used]
+        v = v[used]
+        faces = reverseNormalFaceIds(uvOverlap.UVFaceData(data.name, u, v, data.counts, uvIds))
+    
+    return u, v, data.counts.copy(), uvIds, faces
+
+def setUVData(meshfn, u, v, uvCounts=None, uvIds=None, uvSet=''):
+    """Write all uvs of meshfn with one setUVs call, and their assignment to
+    face-vertices with one assignUVs call if uvCounts and uvIds are given.
+    The uvs are cleared first then, so the number of uvs may shrink too."""
+    if uvCounts is not None:
+        meshfn.clearUVs(uvSet)
+    meshfn.setUVs(np.asarray(u).tolist(), np.asarray(v).tolist(), uvSet)
+    if uvCounts is not None:
+        meshfn.assignUVs(np.asarray(uvCounts).tolist(), np.asarray(uvIds).tolist(), uvSet)
+
+def repairReverseNormalFaces(meshName, mode='auto', uvSet=''):
+    """Mirror the uvs of reversed faces of meshName, see flipUVData.
+    MFnMesh edits made from a script don't go into Maya's undo queue, load
+    plugins/uvFlipRepairCmd.py for an undoable uvFlipRepair command, or put
+    the returned old uvs back with setUVData.
+    
+    return (ids of repaired faces, old (u, v, uvCounts, uvIds))"""
+    meshfn = uvOverlap.getMeshFn(meshName)
+    data = uvOverlap.extractUVFaceData(meshfn, uvSet)
+    faces = reverseNormalFaceIds(data)
+    old = (data.u, data.v, data.counts, data.uvIds)
+    if len(faces) == 0:
+        return faces, old
+    u, v, uvCounts, uvIds, left = flipUVData(data, faces, mode)
+    if np.array_equal(uvIds, data.uvIds):
+        setUVData(meshfn, u, v, uvSet=uvSet)
+    else:
+        setUVData(meshfn, u, v, uvCounts, uvIds, uvSet)
+    return np.setdiff1d(faces, left), old
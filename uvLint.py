@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Mack Stone
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+# Lint the uvs of a mesh, pulled through the API once and shared by all
+# checks.
+#
+# how to use:
+#
+# from maya import cmds
+# import uvLint
+#
+# report = uvLint.lintUVs('pSphere1')
+# report = uvLint.lintUVs('pSphere1', checks=('flipped', 'overlap'))
+# for check, result in report['checks'].items():
+#     print(check, result['count'])
+# cmds.select(uvLint.reportFaceNames(report, 'overlap'), r=1)
+
+import numpy as np
+
+import uvOverlap
+import reverseNormalFaces
+
+LINT_CHECKS = ('flipped', 'overlap', 'degenerate', 'outOfRange', 'zeroLengthEdge')
+# edges shorter than this, in uv units, have zero length
+ZERO_EDGE_LENGTH = 0.000001
+
+
+def outOfRangeFaceIds(data, udims=False):
+    """Return ids of faces with uvs outside of 0-1, or with udims true, of
+    faces crossing udim tile borders or lying outside of the udim range."""
+    faces = np.flatnonzero(data.counts > 0)
+    if udims:
+        return faces[uvOverlap.udimOfFaces(data, faces)[1]]
+    outside = (data.faceU < 0) | (data.faceU > 1) | (data.faceV < 0) | (data.faceV > 1)
+    return np.flatnonzero(np.bincount(data.faceIndices(), weights=outside,
+                                      minlength=data.numFaces) > 0)
+
+def zeroLengthEdges(data, rays=None, tolerance=ZERO_EDGE_LENGTH):
+    """Return (sorted ids of faces with zero length uv edges, face-vertices
+    starting them). The edge of a face-vertex goes to the previous
+    face-vertex, see uvOverlap.createRays."""
+    if rays is None:
+        rays = uvOverlap.createRays(data)
+    vecU, vecV = rays[2:]
+    fvIds = np.flatnonzero(vecU * vecU + vecV * vecV < tolerance * tolerance)
+    faces = data.faceIndices()[fvIds]
+    return uvOverlap._sortedUnique(faces.copy()), fvIds
+
+def lintUVData(data, checks=None, shells=False, udims=False):
+    """Run lint checks on a UVFaceData, sharing bounding circles and rays
+    between them.
+    checks - names from LINT_CHECKS, all of them if None
+    shells - classify flipped faces shell by shell, see
+    reverseNormalFaces.reverseNormalShells
+    udims - outOfRange reports faces crossing udim tiles instead of faces
+    leaving 0-1
+
+    return report dict
+    {'mesh': name, 'faces': number of faces, 'uvs': number of uvs,
+     'checks': {check: {'faces': sorted face ids, 'count': number of faces,
+                        ...}}}
+    overlap also holds 'pairs', (n, 2) overlapping faces, zeroLengthEdge
+    'faceVertices', the face-vertices starting zero length edges"""
+    checks = LINT_CHECKS if checks is None else tuple(checks)
+    unknown = set(checks) - set(LINT_CHECKS)
+    if unknown:
+        raise ValueError('Unknown uv lint checks: %s' % ', '.join(sorted(unknown)))
+
+    results = {}
+    center = radius = rays = None
+    if 'overlap' in checks or 'degenerate' in checks:
+        center, radius = uvOverlap.createBoundingCircle(data)
+    if 'overlap' in checks or 'zeroLengthEdge' in checks:
+        rays = uvOverlap.createRays(data)
+
+    if 'flipped' in checks:
+        if shells:
+            faces = reverseNormalFaces.reverseNormalShells(data)[0]
+        else:
+            faces = reverseNormalFaces.reverseNormalFaceIds(data)
+        results['flipped'] = {'faces': faces}
+    if 'degenerate' in checks or 'overlap' in checks:
+        valid, degenerate = uvOverlap.overlapCandidateFaces(data, radius)
+        if 'degenerate' in checks:
+            results['degenerate'] = {'faces': degenerate}
+    if 'overlap' in checks:
+        pairI, pairJ = uvOverlap.findCandidatePairs(center, radius, valid)
+        hit = uvOverlap.checkCrossingEdgesBatch(data, pairI, pairJ, rays)
+        pairs = np.column_stack((pairI[hit], pairJ[hit]))
+        results['overlap'] = {'faces': np.unique(pairs), 'pairs': pairs}
+    if 'outOfRange' in checks:
+        results['outOfRange'] = {'faces': outOfRangeFaceIds(data, udims)}
+    if 'zeroLengthEdge' in checks:
+        faces, fvIds = zeroLengthEdges(data, rays)
+        results['zeroLengthEdge'] = {'faces': faces, 'faceVertices': fvIds}
+
+    for result in results.values():
+        result['count'] = len(result['faces'])
+    return {'mesh': data.name, 'faces': data.numFaces, 'uvs': len(data.u),
+            'checks': results}
+
+def lintUVs(meshName, checks=None, uvSet='', shells=False, udims=False):
+    """Extract the uvs of meshName once and lint them, see lintUVData"""
+    meshfn = uvOverlap.getMeshFn(meshName)
+    return lintUVData(uvOverlap.extractUVFaceData(meshfn, uvSet), checks, shells, udims)
+
+def reportFaceNames(report, check):
+    """Return compact face names of the faces a check found"""
+    return uvOverlap.faceComponentNames(report['mesh'], report['checks'][check]['faces'])
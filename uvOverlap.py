@@ -34,88 +34,216 @@
 # cmds.polyEditUV('%s.map[12]' % pcube[0], u=-0.057, v=-0.109)
 # overlapFaces = getOverlapUVFaces(pcube[0])
 # cmds.select(overlapFaces, r=1)
+#
+# or work with face ids and select them in one go
+# faceIds, pairs = findOverlapUVFaces(pcube[0], returnPairs=True)
+# selectOverlapUVFaces(pcube[0])
+#
+# results can be kept on disk for meshes checked again and again
+# faceIds = findOverlapUVFaces(pcube[0], cache=True)
+#
+# big meshes can be split into uv tiles checked by a pool of processes
+# overlapFaces = getOverlapUVFaces(pcube[0], processes=8)
+#
+# meshes packed into one atlas are checked against each other in one go
+# overlapFaces = getAtlasOverlapUVFaces(cmds.ls(type='mesh'), crossObjectOnly=True)
 
+import os
+import sys
 import math
-import maya.api.OpenMaya as om
+import hashlib
+import multiprocessing
+import multiprocessing.pool
+
+import numpy as np
+try:
+    import maya.api.OpenMaya as om
+except ImportError:
+    # outside Maya only MFnMesh stand-ins can be used, see meshData.py
+    om = None
+
+
+class UVFaceData(object):
+    """UVs of a polygon mesh pulled through the API in one go, i.e.
+    u, v         - float32 uv coordinates indexed by uv id
+    uvIds        - uv id of every face-vertex, face after face
+    counts       - number of uvs assigned to each face, 0 if unmapped
+    offsets      - face i owns face-vertices offsets[i]:offsets[i+1]
+    faceU, faceV - float32 uv of every face-vertex"""
+
+    def __init__(self, name, u, v, uvCounts, uvIds):
+        self.name = name
+        self.u = np.asarray(u, dtype=np.float32)
+        self.v = np.asarray(v, dtype=np.float32)
+        self.counts = np.asarray(uvCounts, dtype=np.int64)
+        self.uvIds = np.asarray(uvIds, dtype=np.int64)
+        self.offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=self.offsets[1:])
+        self.faceU = self.u[self.uvIds]
+        self.faceV = self.v[self.uvIds]
+
+    @property
+    def numFaces(self):
+        return len(self.counts)
+
+    def faceIndices(self):
+        """Return the face id of every face-vertex."""
+        return np.repeat(np.arange(self.numFaces), self.counts)
+
+class AtlasUVFaceData(UVFaceData):
+    """UVFaceData of many meshes sharing one uv space, i.e. a texture atlas.
+    Faces and uvs of mesh k follow those of mesh k-1
+    names      - mesh names
+    faceStarts - mesh k owns faces faceStarts[k]:faceStarts[k+1]"""
+
+    def __init__(self, datas):
+        datas = list(datas)
+        uvStarts = np.cumsum([0] + [len(d.u) for d in datas])
+        self.faceStarts = np.cumsum([0] + [d.numFaces for d in datas])
+        uvBase = np.repeat(uvStarts[:-1], [len(d.uvIds) for d in datas])
+        cat = lambda arrays, dtype: np.concatenate(arrays) if arrays else np.zeros(0, dtype)
+        UVFaceData.__init__(self, [d.name for d in datas],
+                            cat([d.u for d in datas], np.float32),
+                            cat([d.v for d in datas], np.float32),
+                            cat([d.counts for d in datas], np.int64),
+                            cat([d.uvIds for d in datas], np.int64) + uvBase)
+        self.names = self.name
+
+    def meshOf(self, faces):
+        """Return the mesh index of global face ids."""
+        return np.searchsorted(self.faceStarts, faces, 'right') - 1
+
+    def localFaces(self, faces):
+        """Return (mesh index, face id within that mesh) of global face ids."""
+        faces = np.asarray(faces, dtype=np.int64)
+        mesh = self.meshOf(faces)
+        return mesh, faces - self.faceStarts[mesh]
+
+def getMeshFn(meshName):
+    """Return MFnMesh of given mesh or transform name. A MFnMesh(or anything
+    quacking like one) is passed through as is."""
+    if hasattr(meshName, 'numPolygons'):
+        return meshName
+    # find polygon mesh node
+    selList = om.MSelectionList()
+    selList.add(meshName)
+    dagPath = selList.getDagPath(0)
+    if dagPath.apiType() == om.MFn.kTransform:
+        dagFn = om.MFnDagNode(dagPath)
+        child = dagFn.child(0)
+        if child.apiType() != om.MFn.kMesh:
+            raise Exception("Can't find polygon mesh")
+        dagPath.push(child)
+    return om.MFnMesh(dagPath)
+
+def extractUVFaceData(meshfn, uvSet=''):
+    """Pull all uvs and face-vertex uv ids of meshfn with one getUVs and one
+    getAssignedUVs call.
+    
+    return UVFaceData"""
+    u, v = meshfn.getUVs(uvSet)
+    uvCounts, uvIds = meshfn.getAssignedUVs(uvSet)
+    return UVFaceData(meshfn.name(), u, v, uvCounts, uvIds)
+
+def _ranges(starts, counts):
+    """Concatenate arange(start, start + count) of every start and count."""
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
 
+def _sortedUnique(a):
+    """np.unique of a 1d int array, sorting in place."""
+    a.sort()
+    if len(a) == 0:
+        return a
+    keep = np.empty(len(a), dtype=bool)
+    keep[0] = True
+    np.not_equal(a[1:], a[:-1], out=keep[1:])
+    return a[keep]
 
-def createBoundingCircle(meshfn):
-    """Parameter: meshfn - MFnMesh
+def createBoundingCircle(data, faces=None):
+    """Parameter: data - UVFaceData
+               faces - face ids to work on, all faces if None
     Represent a face by a center and radius, i.e.
-    center = [center1u, center1v, center2u, center2v, ... ]
+    center = [[center1u, center1v], [center2u, center2v], ... ]
     radius = [radius1, radius2,  ... ]
+    Faces without uvs get a zero radius.
     
     return (center, radius)"""
-    center = []
-    radius = []
-    for i in xrange(meshfn.numPolygons):
-        # get uvs from face
-        uarray = []
-        varray = []
-        for j in range(len(meshfn.getPolygonVertices(i))):
-            uv = meshfn.getPolygonUV(i, j)
-            uarray.append(uv[0])
-            varray.append(uv[1])
-        
-        # loop through all vertices to construct edges/rays
-        cu = .0
-        cv = .0
-        for j in range(len(uarray)):
-            cu += uarray[j]
-            cv += varray[j]
-        
-        cu /= len(uarray)
-        cv /= len(varray)
-        rsqr = .0
-        for j in range(len(varray)):
-            du = uarray[j] - cu
-            dv = varray[j] - cv
-            dsqr = du * du + dv * dv
-            rsqr = dsqr if dsqr > rsqr else rsqr
-            
-        center.append(cu)
-        center.append(cv)
-        radius.append(math.sqrt(rsqr))
-        
+    if faces is None:
+        faces = np.arange(data.numFaces)
+    n = len(faces)
+    faceCounts = data.counts[faces]
+    fvIds = _ranges(data.offsets[faces], faceCounts)
+    fid = np.repeat(np.arange(n), faceCounts)
+    counts = np.maximum(faceCounts, 1)
+    fu = data.faceU[fvIds].astype(np.float64)
+    fv = data.faceV[fvIds].astype(np.float64)
+    
+    center = np.empty((n, 2))
+    center[:, 0] = np.bincount(fid, weights=fu, minlength=n) / counts
+    center[:, 1] = np.bincount(fid, weights=fv, minlength=n) / counts
+    
+    du = fu - center[fid, 0]
+    dv = fv - center[fid, 1]
+    dsqr = du * du + dv * dv
+    radius = np.zeros(n)
+    valid = faceCounts > 0
+    if len(dsqr):
+        starts = np.cumsum(faceCounts) - faceCounts
+        radius[valid] = np.sqrt(np.maximum.reduceat(dsqr, starts[valid]))
+    
     return center, radius
 
-def createRayGivenFace(meshfn, faceId):
+def previousFaceVertex(data):
+    """Return the previous face-vertex, within the same face, of every
+    face-vertex."""
+    prev = np.arange(len(data.uvIds)) - 1
+    valid = data.counts > 0
+    prev[data.offsets[:-1][valid]] = data.offsets[1:][valid] - 1
+    return prev
+
+def createRays(data):
+    """Represent every face by a series of edges(rays). Each face-vertex starts
+    a ray pointing to the previous face-vertex of the same face.
+    
+    return (origU, origV, vecU, vecV) aligned with face-vertices"""
+    origU = data.faceU.astype(np.float64)
+    origV = data.faceV.astype(np.float64)
+    prev = previousFaceVertex(data)
+    vecU = origU[prev] - origU
+    vecV = origV[prev] - origV
+    return origU, origV, vecU, vecV
+
+def createRayGivenFace(data, faceId, rays=None):
     """Represent a face by a series of edges(rays), i.e.
     orig = [orig1u, orig1v, orig2u, orig2v, ... ]
     vec  = [vec1u,  vec1v,  vec2u,  vec2v,  ... ]
+    rays - result of createRays(data), computed if not given.
     
     return false if no valid uv's.
     return (true, orig, vec) or (false, None, None)"""
-    orig = []
-    vec = []
-    # get uvs
-    uarray = []
-    varray = []
-    for i in range(len(meshfn.getPolygonVertices(faceId))):
-        uv = meshfn.getPolygonUV(faceId, i)
-        uarray.append(uv[0])
-        varray.append(uv[1])
-    
-    if len(uarray) == 0 or len(varray) == 0:
+    start = data.offsets[faceId]
+    end = data.offsets[faceId + 1]
+    if start == end:
         return (False, None, None)
     
-    # loop throught all vertices to construct edges/rays
-    u = uarray[-1]
-    v = varray[-1]
-    for i in xrange(len(uarray)):
-        orig.append(uarray[i])
-        orig.append(varray[i])
-        vec.append(u - uarray[i])
-        vec.append(v - varray[i])
-        u = uarray[i]
-        v = varray[i]
+    if rays is None:
+        rays = createRays(data)
+    origU, origV, vecU, vecV = rays
+    orig = np.empty(2 * (end - start))
+    vec = np.empty(2 * (end - start))
+    orig[0::2] = origU[start:end]
+    orig[1::2] = origV[start:end]
+    vec[0::2] = vecU[start:end]
+    vec[1::2] = vecV[start:end]
     
-    return (True, orig, vec)
+    return (True, orig.tolist(), vec.tolist())
 
 def area(orig):
     sum = .0
-    num = len(orig)/2
-    for i in xrange(num):
+    num = len(orig)//2
+    for i in range(num):
         idx = 2 * i
         idy = (i + 1) % num
         idy = 2 * idy + 1
@@ -125,6 +253,756 @@ def area(orig):
     
     return math.fabs(sum) * .5
 
+# faces with less area than this times their squared bounding circle radius
+# are degenerate, i.e. zero area faces and slivers
+DEGENERATE_AREA = 0.000001
+
+def faceAreas(data, faces=None):
+    """Vectorized area(), shoelace formula over all given faces at once.
+    
+    return signed uv area of faces, positive for counter clockwise uvs"""
+    if faces is None:
+        faces = np.arange(data.numFaces)
+    faces = np.asarray(faces, dtype=np.int64)
+    counts = data.counts[faces]
+    fvIds = _ranges(data.offsets[faces], counts)
+    local = np.repeat(np.arange(len(faces)), counts)
+    # relative to the first uv of the face to keep precision away from 0-1
+    first = data.offsets[faces][local]
+    u = data.faceU[fvIds].astype(np.float64) - data.faceU[first]
+    v = data.faceV[fvIds].astype(np.float64) - data.faceV[first]
+    nxt = np.arange(1, len(fvIds) + 1)
+    valid = counts > 0
+    ends = np.cumsum(counts)
+    nxt[ends[valid] - 1] = (ends - counts)[valid]
+    cross = u * v[nxt] - u[nxt] * v
+    return np.bincount(local, weights=cross, minlength=len(faces)) * .5
+
+def findDegenerateUVFaces(data, faces=None, radius=None, tolerance=DEGENERATE_AREA):
+    """Return ids of faces with uvs but (almost) no uv area, see
+    DEGENERATE_AREA.
+    radius - bounding circle radius of every face, computed if not given"""
+    if faces is None:
+        faces = np.flatnonzero(data.counts > 0)
+    faces = np.asarray(faces, dtype=np.int64)
+    r = createBoundingCircle(data, faces)[1] if radius is None else radius[faces]
+    # float32 uvs round collinear uvs off their line, allow for that too
+    first = np.minimum(data.offsets[faces], len(data.faceU) - 1)
+    scale = np.fabs(data.faceU[first]) + np.fabs(data.faceV[first]) + r
+    noise = 4 * np.finfo(np.float32).eps * scale * r
+    degenerate = np.fabs(faceAreas(data, faces)) <= tolerance * r * r + noise
+    return faces[degenerate & (data.counts[faces] > 0)]
+
+def overlapCandidateFaces(data, radius=None):
+    """Return ids of faces taking part in the overlap check, faces with uvs
+    which aren't degenerate, and the ids of the degenerate ones."""
+    mapped = np.flatnonzero(data.counts > 0)
+    degenerate = findDegenerateUVFaces(data, mapped, radius)
+    return np.setdiff1d(mapped, degenerate, assume_unique=True), degenerate
+
+def extractPolygonPoints(meshfn, worldSpace=True):
+    """Pull vertex positions and face-vertex vertex ids of meshfn with one
+    getPoints and one getVertices call.
+    
+    return (points (n, 3) float64, vertex count of every face, vertex ids)"""
+    space = None
+    if om is not None:
+        space = om.MSpace.kWorld if worldSpace else om.MSpace.kObject
+    # MPointArray gives x, y, z, w, meshData.MeshData x, y, z
+    points = np.array(meshfn.getPoints(space), dtype=np.float64)
+    points = points.reshape(-1, points.shape[-1] if points.ndim == 2 else 4)[:, :3]
+    vertexCounts, vertexIds = meshfn.getVertices()
+    return (points, np.asarray(vertexCounts, dtype=np.int64),
+            np.asarray(vertexIds, dtype=np.int64))
+
+def computeUVMetrics(data, points, vertexCounts, vertexIds, textureSize=1.):
+    """3D and uv area, texel density and stretch of every face in one go.
+    points, vertexCounts, vertexIds - see extractPolygonPoints
+    textureSize - texels along the texture side, density is in uv units per
+    scene unit for 1
+    
+    return dict of arrays with a value per face, nan for faces without uvs
+    area3d      - scene area, exact for planar faces
+    uvArea      - uv area
+    density     - texels per scene unit, sqrt(uvArea / area3d) * textureSize
+    areaStretch - uvArea / area3d over the same ratio of the whole mesh,
+                  1 where the face gets its share of the texture
+    stretch     - ratio of the largest to the smallest scale of the 3D to uv
+                  mapping of the face's fan triangles, area weighted, 1 for
+                  no shearing or squashing"""
+    numFaces = data.numFaces
+    vOffsets = np.zeros(numFaces + 1, dtype=np.int64)
+    np.cumsum(vertexCounts, out=vOffsets[1:])
+    faceOf = np.repeat(np.arange(numFaces), vertexCounts)
+    
+    # vector area of the polygon, relative to its first vertex
+    p = points[vertexIds] - points[vertexIds[vOffsets[:-1][faceOf]]]
+    nxt = np.arange(1, len(vertexIds) + 1)
+    has = vertexCounts > 0
+    nxt[vOffsets[1:][has] - 1] = vOffsets[:-1][has]
+    cross = np.cross(p, p[nxt])
+    normal = np.column_stack([np.bincount(faceOf, weights=cross[:, k], minlength=numFaces)
+                              for k in range(3)])
+    area3d = np.sqrt((normal * normal).sum(axis=1)) * .5
+    
+    mapped = (data.counts > 0) & (data.counts == vertexCounts)
+    uvArea = np.full(numFaces, np.nan)
+    uvArea[mapped] = np.fabs(faceAreas(data, np.flatnonzero(mapped)))
+    
+    # jacobian of each fan triangle, from a 2D frame in its plane to uv
+    triFace, tris = triangulateFaces(data, np.flatnonzero(mapped))
+    local = tris - data.offsets[triFace][:, None]
+    p0, p1, p2 = (points[vertexIds[vOffsets[triFace] + local[:, k]]] for k in range(3))
+    e1 = p1 - p0
+    e2 = p2 - p0
+    a = np.sqrt((e1 * e1).sum(axis=1))
+    triArea = np.sqrt((np.cross(e1, e2) ** 2).sum(axis=1)) * .5
+    tu = data.faceU[tris].astype(np.float64)
+    tv = data.faceV[tris].astype(np.float64)
+    d1u = tu[:, 1] - tu[:, 0]
+    d1v = tv[:, 1] - tv[:, 0]
+    d2u = tu[:, 2] - tu[:, 0]
+    d2v = tv[:, 2] - tv[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = (e1 * e2).sum(axis=1) / a
+        c = 2. * triArea / a
+        j00 = d1u / a
+        j10 = d1v / a
+        j01 = (d2u - d1u * b / a) / c
+        j11 = (d2v - d1v * b / a) / c
+        # singular values of the 2x2 jacobian
+        q = np.hypot((j00 + j11) * .5, (j10 - j01) * .5)
+        r = np.hypot((j00 - j11) * .5, (j10 + j01) * .5)
+        triStretch = (q + r) / np.fabs(q - r)
+        stretch = (np.bincount(triFace, weights=triStretch * triArea, minlength=numFaces) /
+                   np.bincount(triFace, weights=triArea, minlength=numFaces))
+        ratio = uvArea / area3d
+        scale = np.nansum(uvArea[mapped]) / area3d[mapped].sum()
+        areaStretch = ratio / scale
+        density = np.sqrt(ratio) * textureSize
+    stretch[~mapped] = np.nan
+    return {'area3d': area3d, 'uvArea': uvArea, 'density': density,
+            'areaStretch': areaStretch, 'stretch': stretch}
+
+def shellMetrics(metrics, shells, textureSize=1.):
+    """Per shell aggregates of computeUVMetrics results.
+    shells - (shell ids, number of shells) from computeUVShells
+    textureSize - as given to computeUVMetrics
+    
+    return dict of arrays with a value per shell
+    area3d, uvArea         - summed areas
+    density                - texels per scene unit of the whole shell
+    minDensity, maxDensity - range of face densities
+    stretch                - area weighted face stretch"""
+    shellOf, numShells = shells
+    use = (shellOf >= 0) & np.isfinite(metrics['density'])
+    s = shellOf[use]
+    area3d = np.bincount(s, weights=metrics['area3d'][use], minlength=numShells)
+    uvArea = np.bincount(s, weights=metrics['uvArea'][use], minlength=numShells)
+    density = metrics['density'][use]
+    minDensity = np.full(numShells, np.inf)
+    maxDensity = np.full(numShells, -np.inf)
+    np.minimum.at(minDensity, s, density)
+    np.maximum.at(maxDensity, s, density)
+    stretch = np.where(np.isfinite(metrics['stretch'][use]), metrics['stretch'][use], 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {'area3d': area3d, 'uvArea': uvArea,
+                'density': np.sqrt(uvArea / area3d) * textureSize,
+                'minDensity': minDensity, 'maxDensity': maxDensity,
+                'stretch': np.bincount(s, weights=stretch * metrics['area3d'][use],
+                                       minlength=numShells) / area3d}
+
+def getUVMetrics(meshName, textureSize=1., uvSet='', worldSpace=True):
+    """Return (per face, per shell) uv metrics of meshName, see
+    computeUVMetrics and shellMetrics"""
+    meshfn = getMeshFn(meshName)
+    data = extractUVFaceData(meshfn, uvSet)
+    metrics = computeUVMetrics(data, *extractPolygonPoints(meshfn, worldSpace),
+                               textureSize=textureSize)
+    return metrics, shellMetrics(metrics, computeUVShells(data), textureSize)
+
+# upper bound of grid cells along u or v
+MAX_GRID_DIMENSION = 4096
+# number of candidate pairs generated at once, keeps memory bounded
+PAIR_CHUNK_SIZE = 1 << 20
+
+
+def _pairsWithinGroups(items, starts, counts):
+    """Yield every unordered pair of items sharing a group, in chunks.
+    items are sorted by group, group k owns items[starts[k]:starts[k]+counts[k]].
+    
+    yield (first, second) - positions into items"""
+    pos = np.arange(len(items)) - np.repeat(starts, counts)
+    later = np.repeat(counts, counts) - pos - 1
+    total = np.cumsum(later)
+    begin = 0
+    while begin < len(items):
+        base = total[begin - 1] if begin else 0
+        end = int(np.searchsorted(total, base + PAIR_CHUNK_SIZE, side='right'))
+        end = min(max(end, begin + 1), len(items))
+        cnt = later[begin:end]
+        first = np.repeat(np.arange(begin, end), cnt)
+        step = np.arange(len(first)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        yield first, first + 1 + step
+        begin = end
+
+def _expandCells(faces, x0, y0, x1, y1, numU):
+    """Return one (face, cell key) entry for every cell in the given ranges
+    of a grid numU cells wide."""
+    nx = x1 - x0 + 1
+    num = nx * (y1 - y0 + 1)
+    local = np.arange(num.sum()) - np.repeat(np.cumsum(num) - num, num)
+    nx = np.repeat(nx, num)
+    cx = np.repeat(x0, num) + local % nx
+    cy = np.repeat(y0, num) + local // nx
+    return np.repeat(faces, num), cy * numU + cx
+
+class UVGrid(object):
+    """Uniform grid over uv space. Every face is binned into all the cells
+    its bounding circle's box touches, so only faces sharing a cell(i.e. same
+    or neighbouring cells of their centers) can overlap. Cell size follows the
+    median circle radius.
+    groups - optional group id of every face, faces of different groups
+    never share a cell"""
+
+    def __init__(self, center, radius, faces=None, cellSize=None, groups=None):
+        if faces is None:
+            faces = np.arange(len(radius))
+        faces = np.asarray(faces, dtype=np.int64)
+        self.center = center
+        self.radius = radius
+        self.faces = faces
+        self.groups = groups
+        
+        c = center[faces]
+        r = radius[faces]
+        if len(faces):
+            lo = (c - r[:, None]).min(axis=0)
+            hi = (c + r[:, None]).max(axis=0)
+        else:
+            lo = hi = np.zeros(2)
+        extent = max(float((hi - lo).max()), 1e-12)
+        if cellSize is None:
+            median = float(np.median(r)) if len(r) else 0.
+            cellSize = 2. * median if median > 0 else extent
+        cellSize = max(cellSize, extent / MAX_GRID_DIMENSION)
+        self.cellSize = cellSize
+        self.origin = lo
+        self.dims = np.minimum(np.floor((hi - lo) / cellSize).astype(np.int64) + 1,
+                               MAX_GRID_DIMENSION)
+        
+        self.numCells = self.dims[0] * self.dims[1]
+        
+        self.x0, self.y0, self.x1, self.y1 = self.cellRange(c, r)
+        cellFaces, keys = self._cellKeys(faces, self.x0, self.y0, self.x1, self.y1)
+        order = np.argsort(keys, kind='stable')
+        self.items = cellFaces[order]
+        self.keys, self.starts, self.counts = np.unique(
+            keys[order], return_index=True, return_counts=True)
+
+    def cellRange(self, center, radius):
+        """Return the range of cells (x0, y0, x1, y1) covered by circles."""
+        lo = np.floor((center - radius[:, None] - self.origin) / self.cellSize)
+        hi = np.floor((center + radius[:, None] - self.origin) / self.cellSize)
+        maxCell = self.dims - 1
+        lo = np.clip(lo, 0, maxCell).astype(np.int64)
+        hi = np.clip(hi, 0, maxCell).astype(np.int64)
+        return lo[:, 0], lo[:, 1], hi[:, 0], hi[:, 1]
+
+    def _cellKeys(self, faces, x0, y0, x1, y1):
+        """Return one (face, key) entry for every cell in the given ranges,
+        keys of different groups never match."""
+        faces, keys = _expandCells(faces, x0, y0, x1, y1, self.dims[0])
+        if self.groups is not None:
+            keys += self.groups[faces].astype(np.int64) * self.numCells
+        return faces, keys
+
+    def query(self, center, radius, faces):
+        """Return (faces, others) arrays, pairing each given face with every
+        binned face it shares a cell with, using the given circles. A pair
+        may show up more than once."""
+        faces = np.asarray(faces, dtype=np.int64)
+        x0, y0, x1, y1 = self.cellRange(center[faces], radius[faces])
+        faces, keys = self._cellKeys(faces, x0, y0, x1, y1)
+        pos = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        found = self.keys[pos] == keys if len(self.keys) else np.zeros(len(keys), bool)
+        pos = pos[found]
+        counts = self.counts[pos]
+        others = self.items[_ranges(self.starts[pos], counts)]
+        return np.repeat(faces[found], counts), others
+
+    def iterCandidatePairs(self):
+        """Generator version of candidatePairs, unsorted.
+        
+        yield (i, j, fraction of the binned faces done) chunk by chunk"""
+        # map face id to its position to look up its cell range
+        lookup = np.zeros(len(self.radius), dtype=np.int64)
+        lookup[self.faces] = np.arange(len(self.faces))
+        cellX = self.keys % self.numCells % self.dims[0]
+        cellY = self.keys % self.numCells // self.dims[0]
+        cellOfItem = np.repeat(np.arange(len(self.keys)), self.counts)
+        for first, second in _pairsWithinGroups(self.items, self.starts, self.counts):
+            a = self.items[first]
+            b = self.items[second]
+            # only keep the pair in the first cell both faces share
+            cell = cellOfItem[first]
+            la = lookup[a]
+            lb = lookup[b]
+            keep = ((cellX[cell] == np.maximum(self.x0[la], self.x0[lb])) &
+                    (cellY[cell] == np.maximum(self.y0[la], self.y0[lb])))
+            a = a[keep]
+            b = b[keep]
+            done = float(first[-1] + 1) / len(self.items) if len(first) else 1.
+            yield np.minimum(a, b), np.maximum(a, b), done
+
+    def candidatePairs(self):
+        """Return (i, j) arrays of faces sharing at least one cell, i < j,
+        sorted by i then j. Each pair is reported once."""
+        chunks = [(i, j) for i, j, done in self.iterCandidatePairs()]
+        return _sortPairs(chunks)
+
+def _sortPairs(chunks):
+    """Concatenate (i, j) chunks and sort them by i then j."""
+    if not chunks:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    pi = np.concatenate([chunk[0] for chunk in chunks])
+    pj = np.concatenate([chunk[1] for chunk in chunks])
+    order = np.lexsort((pj, pi))
+    return pi[order], pj[order]
+
+def findCandidatePairs(center, radius, faces=None, cellSize=None):
+    """Broad phase. Return (i, j) arrays of faces whose bounding circles
+    overlap, using a UVGrid to avoid testing every face against every other."""
+    grid = UVGrid(center, radius, faces, cellSize)
+    i, j = grid.candidatePairs()
+    keep = circlesOverlap(center, radius, i, j)
+    return i[keep], j[keep]
+
+def circlesOverlap(center, radius, i, j):
+    """Return bool array, true if bounding circles of faces i and j overlap."""
+    # Quick rejection if bounding circles don't overlap
+    d = center[j] - center[i]
+    dsqr = d[:, 0] * d[:, 0] + d[:, 1] * d[:, 1]
+    rsum = radius[i] + radius[j]
+    return dsqr < rsum * rsum
+
+def uniquePairs(i, j):
+    """Order each pair as (min, max), drop self pairs and duplicates.
+    
+    return (i, j) sorted by i then j"""
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    lo = np.minimum(i, j)
+    hi = np.maximum(i, j)
+    keep = lo != hi
+    n = hi.max(initial=0) + 1
+    key = _sortedUnique(lo[keep] * n + hi[keep])
+    return key // n, key % n
+
+def unionFind(numNodes, a, b):
+    """Join nodes a[k] and b[k] for every k, all at once.
+    
+    return the root, the smallest node, of the set each node belongs to"""
+    parent = np.arange(numNodes)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    while True:
+        rootA = parent[a]
+        rootB = parent[b]
+        diff = rootA != rootB
+        if not diff.any():
+            return parent
+        # hook the bigger root under the smaller one
+        np.minimum.at(parent, np.maximum(rootA[diff], rootB[diff]),
+                      np.minimum(rootA[diff], rootB[diff]))
+        # path compression
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+def computeUVShells(data):
+    """Find uv shells(islands), faces connected through shared uv ids.
+    
+    return (shell id of every face, -1 for faces without uvs, number of shells)"""
+    valid = data.counts > 0
+    firstUV = np.full(data.numFaces, -1, dtype=np.int64)
+    firstUV[valid] = data.uvIds[data.offsets[:-1][valid]]
+    roots = unionFind(len(data.u), data.uvIds, np.repeat(firstUV, data.counts))
+    shells = np.full(data.numFaces, -1, dtype=np.int64)
+    labels, shells[valid] = np.unique(roots[firstUV[valid]], return_inverse=True)
+    return shells, len(labels)
+
+def convexFaces(data, faces):
+    """Return bool array, true for the given faces turning the same way, by
+    more than nothing, at every corner and only once around, i.e. strictly
+    convex faces of either winding."""
+    faces = np.asarray(faces, dtype=np.int64)
+    counts = data.counts[faces]
+    fvIds = _ranges(data.offsets[faces], counts)
+    faceOf = np.repeat(np.arange(len(faces)), counts)
+    local = fvIds - np.repeat(data.offsets[faces], counts)
+    start = fvIds - local
+    nxt = start + (local + 1) % counts[faceOf]
+    prv = start + (local - 1) % counts[faceOf]
+    u = data.faceU.astype(np.float64)
+    v = data.faceV.astype(np.float64)
+    inU = u[fvIds] - u[prv]
+    inV = v[fvIds] - v[prv]
+    outU = u[nxt] - u[fvIds]
+    outV = v[nxt] - v[fvIds]
+    turn = inU * outV - inV * outU
+    left = np.bincount(faceOf, weights=turn > 0, minlength=len(faces))
+    right = np.bincount(faceOf, weights=turn < 0, minlength=len(faces))
+    # all turns one way still winds twice around for a pentagram
+    angle = np.bincount(faceOf, weights=np.arctan2(turn, inU * outU + inV * outV),
+                        minlength=len(faces))
+    return (counts >= 3) & ((left == counts) | (right == counts)) & (np.fabs(angle) < 3 * np.pi)
+
+def separatedNeighbourPairs(data, faces=None):
+    """Return sorted keys i * numFaces + j, i < j, of strictly convex faces
+    sharing a uv whose corners at that uv lie on either side of a line
+    through it. A convex face lies inside the wedge of its corner, so such
+    faces only touch at the line and none of their edges can cross, they
+    are checked here instead of by checkCrossingEdges. Folded or twisted
+    neighbours aren't separated and keep their pair."""
+    if faces is None:
+        faces = np.flatnonzero(data.counts > 0)
+    faces = np.asarray(faces, dtype=np.int64)
+    fvIds = _ranges(data.offsets[faces], data.counts[faces])
+    convex = np.zeros(data.numFaces, dtype=bool)
+    convex[faces] = convexFaces(data, faces)
+    faceOf = np.repeat(faces, data.counts[faces])
+    keep = convex[faceOf]
+    fvIds = fvIds[keep]
+    faceOf = faceOf[keep]
+    # the two edges leaving every corner
+    local = fvIds - data.offsets[faceOf]
+    start = fvIds - local
+    u = data.faceU.astype(np.float64)
+    v = data.faceV.astype(np.float64)
+    nxt = start + (local + 1) % data.counts[faceOf]
+    prv = start + (local - 1) % data.counts[faceOf]
+    rays = np.stack((u[nxt] - u[fvIds], v[nxt] - v[fvIds],
+                     u[prv] - u[fvIds], v[prv] - v[fvIds]), axis=1)
+    
+    uvIds = data.uvIds[fvIds]
+    order = np.argsort(uvIds, kind='stable')
+    _, starts, counts = np.unique(uvIds[order], return_index=True, return_counts=True)
+    n = data.numFaces
+    keys = [np.zeros(0, np.int64)]
+    for first, second in _pairsWithinGroups(order, starts, counts):
+        a = order[first]
+        b = order[second]
+        fa = faceOf[a]
+        fb = faceOf[b]
+        other = fa != fb
+        a = a[other]
+        b = b[other]
+        sep = _cornersSeparated(rays[a], rays[b])
+        fa = fa[other][sep]
+        fb = fb[other][sep]
+        keys.append(np.minimum(fa, fb) * n + np.maximum(fa, fb))
+    return _sortedUnique(np.concatenate(keys))
+
+def _cornersSeparated(cornerA, cornerB):
+    """Return bool array, true where a line through the shared corner has
+    both edges of corner A on one side and both edges of corner B on the
+    other, touching allowed. Corners are (n, 4) arrays of the two edge
+    vectors leaving them, each corner narrower than a half turn, so one of
+    the four edges lies on such a line if there is one."""
+    cross = lambda r, e: r[:, 0] * e[:, 1] - r[:, 1] * e[:, 0]
+    edges = (cornerA[:, :2], cornerA[:, 2:], cornerB[:, :2], cornerB[:, 2:])
+    separated = np.zeros(len(cornerA), dtype=bool)
+    for r in edges:
+        a1, a2, b1, b2 = [cross(r, e) for e in edges]
+        separated |= (a1 >= 0) & (a2 >= 0) & (b1 <= 0) & (b2 <= 0)
+        separated |= (a1 <= 0) & (a2 <= 0) & (b1 >= 0) & (b2 >= 0)
+    return separated
+
+def dropNeighbourPairs(data, pairI, pairJ, faces=None):
+    """Return (i, j) without the pairs of neighbouring faces that can't
+    overlap, see separatedNeighbourPairs. The overlaps found don't change.
+    faces - only these faces take part in pairI, pairJ"""
+    return _dropPairKeys(separatedNeighbourPairs(data, faces), data.numFaces, pairI, pairJ)
+
+def _dropPairKeys(keys, numFaces, pairI, pairJ):
+    """Return (i, j) without the pairs whose key i * numFaces + j is in the
+    sorted keys."""
+    if len(keys) == 0 or len(pairI) == 0:
+        return pairI, pairJ
+    pairKeys = pairI * numFaces + pairJ
+    pos = np.minimum(np.searchsorted(keys, pairKeys), len(keys) - 1)
+    keep = keys[pos] != pairKeys
+    return pairI[keep], pairJ[keep]
+
+# shells match when their shapes agree within this fraction of their size
+STACK_TOLERANCE = 0.001
+
+def shellSignatures(data, shells=None):
+    """Describe every shell independent of face and uv order, i.e. topology
+    (faces, face-vertices, uvs, sum of squared face sizes) and normalized shape
+    (centroid, box and second moments of its face-vertex uvs).
+    
+    return (topology (numShells, 4) int64, shape (numShells, 9) float64,
+    size (numShells,) box diagonal)"""
+    if shells is None:
+        shells = computeUVShells(data)
+    shellOf, numShells = shells
+    mapped = shellOf >= 0
+    fvShell = np.repeat(shellOf, data.counts)
+    fvShell = fvShell[fvShell >= 0]
+    fvIds = _ranges(data.offsets[:-1][mapped], data.counts[mapped])
+    u = data.faceU[fvIds].astype(np.float64)
+    v = data.faceV[fvIds].astype(np.float64)
+    
+    uvShell = np.full(len(data.u), -1, dtype=np.int64)
+    uvShell[data.uvIds[fvIds]] = fvShell
+    counts = data.counts[mapped]
+    topology = np.column_stack((
+        np.bincount(shellOf[mapped], minlength=numShells),
+        np.bincount(fvShell, minlength=numShells),
+        np.bincount(uvShell[uvShell >= 0], minlength=numShells),
+        np.bincount(shellOf[mapped], weights=counts * counts, minlength=numShells)))
+    
+    n = np.maximum(topology[:, 1], 1)
+    cu = np.bincount(fvShell, weights=u, minlength=numShells) / n
+    cv = np.bincount(fvShell, weights=v, minlength=numShells) / n
+    du = u - cu[fvShell]
+    dv = v - cv[fvShell]
+    lo = np.full((numShells, 2), np.inf)
+    hi = np.full((numShells, 2), -np.inf)
+    for axis, d in enumerate((du, dv)):
+        np.minimum.at(lo[:, axis], fvShell, d)
+        np.maximum.at(hi[:, axis], fvShell, d)
+    moments = [np.bincount(fvShell, weights=a * b, minlength=numShells) / n
+               for a, b in ((du, du), (dv, dv), (du, dv))]
+    shape = np.column_stack([cu, cv, lo, hi] + moments)
+    size = np.hypot(*(hi - lo).T)
+    return topology.astype(np.int64), shape, size
+
+def findStackedShells(data, shells=None, tolerance=STACK_TOLERANCE):
+    """Find shells lying on top of a copy of themselves, as mirrored or
+    instanced parts often do on purpose. Shells are hashed into a grid by
+    their centroid, so only shells with nearby centroids get compared, then
+    need the same topology and a shape matching within tolerance times their
+    size.
+    
+    return stack id of every shell, -1 if it isn't stacked"""
+    if shells is None:
+        shells = computeUVShells(data)
+    numShells = shells[1]
+    topology, shape, size = shellSignatures(data, shells)
+    a, b = findCandidatePairs(shape[:, :2], tolerance * size)
+    same = (topology[a] == topology[b]).all(axis=1)
+    a = a[same]
+    b = b[same]
+    pairSize = np.maximum(size[a], size[b])
+    limit = np.repeat((tolerance * pairSize)[:, None], 9, axis=1)
+    # moments are squared lengths
+    limit[:, 6:] *= pairSize[:, None]
+    same = (np.fabs(shape[a] - shape[b]) <= limit).all(axis=1)
+    a = a[same]
+    b = b[same]
+    roots = unionFind(numShells, a, b)
+    stacked = np.zeros(numShells, dtype=bool)
+    stacked[a] = stacked[b] = True
+    stackOf = np.full(numShells, -1, dtype=np.int64)
+    stackOf[stacked] = np.unique(roots[stacked], return_inverse=True)[1]
+    return stackOf
+
+def dropStackedPairs(shellOf, stackOf, pairI, pairJ):
+    """Return (i, j) without pairs of faces from different shells of one
+    stack, their overlap is wanted."""
+    stackI = stackOf[shellOf[pairI]]
+    keep = ((shellOf[pairI] == shellOf[pairJ]) | (stackI < 0) |
+            (stackI != stackOf[shellOf[pairJ]]))
+    return pairI[keep], pairJ[keep]
+
+def triangulateFaces(data, faces=None):
+    """Fan triangulate faces, triangle t of a face with n uvs uses its
+    face-vertices 0, t + 1, t + 2.
+    
+    return (face id of each triangle, (m, 3) face-vertex ids of triangles)"""
+    if faces is None:
+        faces = np.flatnonzero(data.counts > 0)
+    faces = np.asarray(faces, dtype=np.int64)
+    numTris = np.maximum(data.counts[faces] - 2, 0)
+    triFace = np.repeat(faces, numTris)
+    local = _ranges(np.zeros(len(faces), dtype=np.int64), numTris)
+    first = data.offsets[triFace]
+    return triFace, np.column_stack((first, first + local + 1, first + local + 2))
+
+def rasterCandidateFaces(data, faces=None, resolution=4096):
+    """Approximate pre-pass. Rasterize every face into a coverage count buffer
+    of resolution texels along the longer side of the uv bounds, scanline by
+    scanline, faces on texels covered more than once are candidates.
+    Triangles too small to cover a texel center count for the texel under
+    their centroid. Cost
+    depends on the resolution rather than on the number of faces, overlaps
+    smaller than a texel may be missed.
+    
+    return sorted ids of candidate faces"""
+    triFace, tris = triangulateFaces(data, faces)
+    if len(triFace) == 0:
+        return np.zeros(0, np.int64)
+    tu = data.faceU[tris].astype(np.float64)
+    tv = data.faceV[tris].astype(np.float64)
+    origin = np.array([tu.min(), tv.min()])
+    texel = max(tu.max() - origin[0], tv.max() - origin[1], 1e-12) / resolution
+    dims = np.minimum(np.floor((np.array([tu.max(), tv.max()]) - origin) / texel)
+                      .astype(np.int64) + 1, resolution)
+    # texel space, texel centers are on integers
+    tu = (tu - origin[0]) / texel - .5
+    tv = (tv - origin[1]) / texel - .5
+    rowLo = np.ceil(tv.min(axis=1))
+    rowHi = np.floor(tv.max(axis=1))
+    y0 = np.clip(rowLo, 0, dims[1] - 1).astype(np.int64)
+    y1 = np.clip(rowHi, 0, dims[1] - 1).astype(np.int64)
+    rows = np.where(rowLo <= rowHi, y1 - y0 + 1, 0)
+    
+    # scanlines, one (triangle, row) at a time through texel center rows
+    covered = []
+    coveredTri = []
+    tris = np.flatnonzero(rows)
+    width = np.ceil(tu.max(axis=1) - tu.min(axis=1)) + 1
+    total = np.cumsum(rows[tris] * width[tris])
+    start = 0
+    while start < len(tris):
+        base = total[start - 1] if start else 0
+        end = int(np.searchsorted(total, base + PAIR_CHUNK_SIZE, side='right'))
+        end = min(max(end, start + 1), len(tris))
+        chunk = tris[start:end]
+        t = np.repeat(chunk, rows[chunk])
+        py = (y0[chunk].repeat(rows[chunk]) +
+              _ranges(np.zeros(len(chunk), dtype=np.int64), rows[chunk])).astype(np.float64)
+        # span of the row inside the triangle, from the edges crossing it
+        xmin = np.full(len(t), np.inf)
+        xmax = np.full(len(t), -np.inf)
+        for k in range(3):
+            au = tu[t, k]
+            av = tv[t, k]
+            bu = tu[t, (k + 1) % 3]
+            bv = tv[t, (k + 1) % 3]
+            dv = bv - av
+            on = (py >= np.minimum(av, bv)) & (py <= np.maximum(av, bv)) & (dv != 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x = au + (py - av) * (bu - au) / dv
+            xmin = np.where(on, np.minimum(xmin, x), xmin)
+            xmax = np.where(on, np.maximum(xmax, x), xmax)
+        xs = np.clip(np.ceil(xmin), 0, dims[0] - 1)
+        xe = np.clip(np.floor(xmax), 0, dims[0] - 1)
+        span = (np.ceil(xmin) <= np.floor(xmax)) & (xs <= xe)
+        t = t[span]
+        xs = xs[span].astype(np.int64)
+        num = xe[span].astype(np.int64) - xs + 1
+        rowKeys = py[span].astype(np.int64) * dims[0] + xs
+        covered.append(_ranges(rowKeys, num))
+        coveredTri.append(np.repeat(t, num))
+        start = end
+    
+    # triangles too small to cover a texel center use their centroid's texel
+    missed = np.ones(len(triFace), dtype=bool)
+    for t in coveredTri:
+        missed[t] = False
+    cx = np.clip(np.rint(tu[missed].mean(axis=1)), 0, dims[0] - 1).astype(np.int64)
+    cy = np.clip(np.rint(tv[missed].mean(axis=1)), 0, dims[1] - 1).astype(np.int64)
+    covered.append(cy * dims[0] + cx)
+    coveredTri.append(np.flatnonzero(missed))
+    coveredFace = [triFace[t] for t in coveredTri]
+    
+    n = data.numFaces
+    key = _sortedUnique(np.concatenate(covered) * n + np.concatenate(coveredFace))
+    texels = key // n
+    texelFaces = key % n
+    counts = np.bincount(texels, minlength=dims[0] * dims[1])
+    return _sortedUnique(texelFaces[counts[texels] > 1])
+
+class UVPointIndex(object):
+    """Find the face under uv points. Faces are fan triangulated, see
+    triangulateFaces, and the triangles binned into a UVGrid, so every point
+    is only tested against the triangles of its grid cell. Concave faces may
+    claim points just outside of them.
+    
+    index = UVPointIndex(extractUVFaceData(getMeshFn('pPlane1')))
+    faces, fvIds, weights = index.query(u, v)
+    color = (weights[:, :, None] * fvColors[fvIds]).sum(axis=1)"""
+
+    def __init__(self, data, faces=None):
+        self.data = data
+        self.triFace, self.tris = triangulateFaces(data, faces)
+        tu = data.faceU[self.tris].astype(np.float64)
+        tv = data.faceV[self.tris].astype(np.float64)
+        self.origin = np.column_stack((tu[:, 0], tv[:, 0]))
+        self.edge1 = np.column_stack((tu[:, 1] - tu[:, 0], tv[:, 1] - tv[:, 0]))
+        self.edge2 = np.column_stack((tu[:, 2] - tu[:, 0], tv[:, 2] - tv[:, 0]))
+        self.det = (self.edge1[:, 0] * self.edge2[:, 1] -
+                    self.edge2[:, 0] * self.edge1[:, 1])
+        lo = np.column_stack((tu.min(axis=1), tv.min(axis=1)))
+        hi = np.column_stack((tu.max(axis=1), tv.max(axis=1)))
+        self.grid = UVGrid((lo + hi) * .5, np.hypot(*(hi - lo).T) * .5)
+
+    def barycentric(self, tris, points):
+        """Return (n, 3) barycentric weights of points in triangles tris."""
+        d = points - self.origin[tris]
+        e1 = self.edge1[tris]
+        e2 = self.edge2[tris]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w1 = (d[:, 0] * e2[:, 1] - e2[:, 0] * d[:, 1]) / self.det[tris]
+            w2 = (e1[:, 0] * d[:, 1] - d[:, 0] * e1[:, 1]) / self.det[tris]
+        return np.column_stack((1. - w1 - w2, w1, w2))
+
+    def query(self, u, v, tolerance=1e-9):
+        """Locate uv points, points on shared edges or in overlapping faces
+        go to the face with the lowest id.
+        tolerance - how far outside of a triangle, in barycentric weights,
+        still counts as inside
+        
+        return (face id of every point, -1 if there is none,
+        (n, 3) face-vertex ids of the triangle holding it,
+        (n, 3) barycentric weights of those face-vertices)"""
+        points = np.column_stack((np.ravel(u), np.ravel(v))).astype(np.float64)
+        n = len(points)
+        grid = self.grid
+        best = np.full(n, len(self.triFace), dtype=np.int64)
+        if len(grid.keys):
+            x0, y0, x1, y1 = grid.cellRange(points, np.zeros(n))
+            keys = y0 * grid.dims[0] + x0
+            # sorted keys search much faster than scattered ones
+            order = np.argsort(keys)
+            pos = np.empty(n, dtype=np.int64)
+            pos[order] = np.searchsorted(grid.keys, keys[order])
+            pos = np.minimum(pos, len(grid.keys) - 1)
+            counts = np.where(grid.keys[pos] == keys, grid.counts[pos], 0)
+            total = np.cumsum(counts)
+            start = 0
+            # bounded number of (point, triangle) tests at once
+            while start < n:
+                base = total[start - 1] if start else 0
+                end = int(np.searchsorted(total, base + PAIR_CHUNK_SIZE, side='right'))
+                end = min(max(end, start + 1), n)
+                num = counts[start:end]
+                p = np.repeat(np.arange(start, end), num)
+                t = grid.items[_ranges(grid.starts[pos[start:end]], num)]
+                weights = self.barycentric(t, points[p])
+                inside = (weights >= -tolerance).all(axis=1) & (self.det[t] != 0)
+                np.minimum.at(best, p[inside], t[inside])
+                start = end
+        
+        found = best < len(self.triFace)
+        faces = np.full(n, -1, dtype=np.int64)
+        fvIds = np.full((n, 3), -1, dtype=np.int64)
+        weights = np.zeros((n, 3))
+        faces[found] = self.triFace[best[found]]
+        fvIds[found] = self.tris[best[found]]
+        weights[found] = self.barycentric(best[found], points[found])
+        return faces, fvIds, weights
+
+def createUVPointIndex(meshName, uvSet=''):
+    """Return UVPointIndex of all faces with uvs of meshName"""
+    return UVPointIndex(extractUVFaceData(getMeshFn(meshName), uvSet))
+
 def checkCrossingEdges(face1Orig, face1Vec, face2Orig, face2Vec):
     """Check if there are crossing edges between two faces. Return true 
     if there are crossing edges and false otherwise. A face is represented
@@ -133,14 +1011,14 @@ def checkCrossingEdges(face1Orig, face1Vec, face2Orig, face2Vec):
     faceVec[]  = [vec1u,  vec1v,  vec2u,  vec2v,  ... ]"""
     face1Size = len(face1Orig)
     face2Size = len(face2Orig)
-    for i in xrange(0, face1Size, 2):
+    for i in range(0, face1Size, 2):
         o1x = face1Orig[i]
         o1y = face1Orig[i+1]
         v1x = face1Vec[i]
         v1y = face1Vec[i+1]
         n1x = v1y
         n1y = -v1x
-        for j in xrange(0, face2Size, 2):
+        for j in range(0, face2Size, 2):
             # Given ray1(O1, V1) and ray2(O2, V2)
             # Normal of ray1 is (V1.y, V1.x)
             o2x = face2Orig[j]
@@ -170,51 +1048,774 @@ def checkCrossingEdges(face1Orig, face1Vec, face2Orig, face2Vec):
         
     return 0
 
-def getOverlapUVFaces(meshName):
-    """Return overlapping faces"""
-    faces = []
-    # find polygon mesh node
-    selList = om.MSelectionList()
-    selList.add(meshName)
-    mesh = selList.getDependNode(0)
-    if mesh.apiType() == om.MFn.kTransform:
-        dagPath = selList.getDagPath(0)
-        dagFn = om.MFnDagNode(dagPath)
-        child = dagFn.child(0)
-        if child.apiType() != om.MFn.kMesh:
-            raise Exception("Can't find polygon mesh")
-        mesh = child
-    meshfn = om.MFnMesh(mesh)
-    
-    center, radius = createBoundingCircle(meshfn)
-    for i in xrange(meshfn.numPolygons):
-        rayb1, face1Orig, face1Vec = createRayGivenFace(meshfn, i)
-        if not rayb1: continue
-        cui = center[2*i]
-        cvi = center[2*i+1]
-        ri = radius[i]
-        # Exclude the degenerate face
-        # if(area(face1Orig) < 0.000001) continue;
-        # Loop through face j where j != i
-        for j in range(i+1, meshfn.numPolygons):
-            cuj = center[2*j]
-            cvj = center[2*j+1]
-            rj = radius[j]
-            du = cuj - cui
-            dv = cvj - cvi
-            dsqr = du * du + dv * dv
-            # Quick rejection if bounding circles don't overlap
-            if (dsqr >= (ri + rj) * (ri + rj)): continue
-            
-            rayb2, face2Orig, face2Vec = createRayGivenFace(meshfn, j)
-            if not rayb2: continue
-            # Exclude the degenerate face
-            # if(area(face2Orig) < 0.000001): continue;
-            if checkCrossingEdges(face1Orig, face1Vec, face2Orig, face2Vec):
-                face1 = '%s.f[%d]' % (meshfn.name(), i)
-                face2 = '%s.f[%d]' % (meshfn.name(), j)
-                if face1 not in faces:
-                    faces.append(face1)
-                if face2 not in faces:
-                    faces.append(face2)
+def checkCrossingEdgesBatch(data, pairI, pairJ, rays=None):
+    """Vectorized checkCrossingEdges. Test every edge of face pairI[k] against
+    every edge of face pairJ[k] at once, with the same tolerances.
+    rays - result of createRays(data), computed if not given.
+    
+    return bool array, true for pairs with crossing edges"""
+    if rays is None:
+        rays = createRays(data)
+    origU, origV, vecU, vecV = rays
+    pairI = np.asarray(pairI, dtype=np.int64)
+    pairJ = np.asarray(pairJ, dtype=np.int64)
+    countJ = data.counts[pairJ]
+    tests = data.counts[pairI] * countJ
+    total = np.cumsum(tests)
+    hit = np.zeros(len(pairI), dtype=bool)
+    start = 0
+    while start < len(pairI):
+        base = total[start - 1] if start else 0
+        end = int(np.searchsorted(total, base + PAIR_CHUNK_SIZE, side='right'))
+        end = min(max(end, start + 1), len(pairI))
+        num = tests[start:end]
+        pairOf = np.repeat(np.arange(end - start), num)
+        local = np.arange(len(pairOf)) - np.repeat(np.cumsum(num) - num, num)
+        cj = countJ[start:end][pairOf]
+        # edge of face1 and edge of face2 for every test
+        e1 = data.offsets[pairI[start:end]][pairOf] + local // cj
+        e2 = data.offsets[pairJ[start:end]][pairOf] + local % cj
+        
+        o1x = origU[e1]
+        o1y = origV[e1]
+        v1x = vecU[e1]
+        v1y = vecV[e1]
+        n1x = v1y
+        n1y = -v1x
+        o2x = origU[e2]
+        o2y = origV[e2]
+        v2x = vecU[e2]
+        v2y = vecV[e2]
+        n2x = v2y
+        n2y = -v2x
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Find t for ray2, edges are parallel if denum is close to 0.
+            denum2 = v2x * n1x + v2y * n1y
+            t2 = ((o1x-o2x)* n1x + (o1y-o2y) * n1y) / denum2
+            # Find t for ray1
+            denum1 = v1x * n2x + v1y * n2y
+            t1 = ((o2x-o1x)* n2x + (o2y-o1y) * n2y) / denum1
+        cross = ((np.fabs(denum2) >= 0.000001) & (t2 >= 0.00001) & (t2 <= 0.99999) &
+                 (np.fabs(denum1) >= 0.000001) & (t1 > 0.00001) & (t1 < 0.99999))
+        hit[start:end] = np.bincount(pairOf[cross], minlength=end - start) > 0
+        start = end
+    
+    return hit
+
+def _tileOf(points, tiling):
+    """Return the tile (tu, tv) each uv point falls into."""
+    origin, tileSize, numTiles = tiling
+    tile = np.floor((points - origin) / tileSize).astype(np.int64)
+    return np.clip(tile, 0, numTiles - 1)
+
+def _overlapTile(arrays, faces, cellSize=None, tile=None, tiling=None):
+    """Test the faces of one tile against each other. If tile and tiling are
+    given, only pairs owned by the tile are tested.
+    
+    return overlapping pairs (i, j)"""
+    center = arrays['center']
+    radius = arrays['radius']
+    grid = UVGrid(center, radius, faces, cellSize)
+    i, j = grid.candidatePairs()
+    keep = circlesOverlap(center, radius, i, j)
+    i = i[keep]
+    j = j[keep]
+    if tile is not None:
+        # faces crossing tile borders are in every tile they touch, a pair is
+        # only tested by the tile holding the low corner of their shared box
+        lo = np.maximum(center[i] - radius[i, None], center[j] - radius[j, None])
+        owner = _tileOf(lo, tiling)
+        keep = (owner[:, 0] == tile[0]) & (owner[:, 1] == tile[1])
+        i = i[keep]
+        j = j[keep]
+    if 'neighbours' in arrays:
+        i, j = _dropPairKeys(arrays['neighbours'], len(arrays['counts']), i, j)
+    if 'stackOf' in arrays:
+        i, j = dropStackedPairs(arrays['shellOf'], arrays['stackOf'], i, j)
+    rays = (arrays['origU'], arrays['origV'], arrays['vecU'], arrays['vecV'])
+    hit = checkCrossingEdgesBatch(_FaceOffsets(arrays['counts'], arrays['offsets']),
+                                  i, j, rays)
+    return i[hit], j[hit]
+
+class _FaceOffsets(object):
+    """The part of UVFaceData checkCrossingEdgesBatch reads."""
+
+    def __init__(self, counts, offsets):
+        self.counts = counts
+        self.offsets = offsets
+
+# arrays of the mesh attached by a tile worker process
+_workerArrays = None
+_workerBlocks = []
+
+def _initTileWorker(spec):
+    """Pool initializer, attach the shared mesh arrays once per process."""
+    from multiprocessing import shared_memory
+    global _workerArrays
+    _workerArrays = {}
+    for key, (name, shape, dtype) in spec.items():
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        _workerBlocks.append(shm)
+        _workerArrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _overlapTileWorker(task):
+    return _overlapTile(_workerArrays, *task)
+
+def _processContext():
+    """Return a spawn context, pointing at mayapy when running inside Maya."""
+    ctx = multiprocessing.get_context('spawn')
+    exe = os.path.basename(sys.executable).lower()
+    if exe.startswith('maya') and not exe.startswith('mayapy'):
+        mayapy = 'mayapy.exe' if sys.platform == 'win32' else 'mayapy'
+        ctx.set_executable(os.path.join(os.path.dirname(sys.executable), mayapy))
+    return ctx
+
+def _runTiles(arrays, tasks, processes=0, threads=0):
+    """Run _overlapTile over tasks on a process or thread pool, or in this
+    thread if both processes and threads are 0."""
+    if processes <= 0 and threads <= 0:
+        return [_overlapTile(arrays, *task) for task in tasks]
+    if processes > 0:
+        from multiprocessing import shared_memory
+        blocks = []
+        spec = {}
+        try:
+            for key, arr in arrays.items():
+                shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                blocks.append(shm)
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+                spec[key] = (shm.name, arr.shape, arr.dtype.str)
+            pool = _processContext().Pool(processes, _initTileWorker, (spec,))
+            try:
+                results = pool.map(_overlapTileWorker, tasks, chunksize=1)
+            finally:
+                pool.terminate()
+                pool.join()
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+        return results
+    
+    # numpy releases the GIL inside array operations
+    pool = multiprocessing.pool.ThreadPool(threads)
+    try:
+        return pool.map(lambda task: _overlapTile(arrays, *task), tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def findOverlapPairsTiled(data, center, radius, faces, processes=0, threads=0, tiles=None,
+                          cullNeighbours=False, stacked=False):
+    """Split uv space into tiles and test each tile on a process pool(or a
+    thread pool if processes is 0) over shared memory copies of the mesh
+    arrays. Faces crossing tile borders go to every tile they touch.
+    processes - number of worker processes
+    threads   - number of worker threads, used when processes is 0
+    tiles     - (tilesU, tilesV), by default 4 tiles per worker
+    cullNeighbours - skip neighbouring faces that can't overlap, see
+                dropNeighbourPairs
+    stacked   - skip pairs between shells stacked on a copy of themselves
+    
+    return overlapping pairs (i, j) sorted by i then j"""
+    workers = processes if processes > 0 else max(threads, 1)
+    if tiles is None:
+        side = int(math.ceil(math.sqrt(4 * workers)))
+        tiles = (side, side)
+    faces = np.asarray(faces, dtype=np.int64)
+    if len(faces) == 0:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    
+    c = center[faces]
+    r = radius[faces][:, None]
+    lo = (c - r).min(axis=0)
+    hi = (c + r).max(axis=0)
+    numTiles = np.array(tiles, dtype=np.int64)
+    tileSize = np.maximum((hi - lo) / numTiles, 1e-12)
+    # every tile bins faces with the cell size of the whole mesh
+    cellSize = 2. * float(np.median(radius[faces])) or None
+    tiling = (lo, tileSize, numTiles)
+    
+    t0 = _tileOf(c - r, tiling)
+    t1 = _tileOf(c + r, tiling)
+    tileFaces, keys = _expandCells(faces, t0[:, 0], t0[:, 1], t1[:, 0], t1[:, 1],
+                                   numTiles[0])
+    order = np.argsort(keys, kind='stable')
+    tileFaces = tileFaces[order]
+    keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    tasks = []
+    for key, start, count in zip(keys.tolist(), starts.tolist(), counts.tolist()):
+        tile = (key % numTiles[0], key // numTiles[0])
+        tasks.append((tileFaces[start:start + count], cellSize, tile, tiling))
+    # biggest tiles first to keep the workers busy
+    tasks.sort(key=lambda task: -len(task[0]))
+    
+    arrays = _tileArrays(data, center, radius)
+    if cullNeighbours:
+        arrays['neighbours'] = separatedNeighbourPairs(data, faces)
+    if stacked:
+        shellData = computeUVShells(data)
+        arrays['shellOf'] = shellData[0]
+        arrays['stackOf'] = findStackedShells(data, shellData)
+    results = _runTiles(arrays, tasks, processes, threads)
+    pairI = np.concatenate([res[0] for res in results])
+    pairJ = np.concatenate([res[1] for res in results])
+    return uniquePairs(pairI, pairJ)
+
+def _tileArrays(data, center, radius):
+    """Return the arrays tile workers read."""
+    origU, origV, vecU, vecV = createRays(data)
+    return dict(counts=data.counts, offsets=data.offsets, center=center,
+                radius=radius, origU=origU, origV=origV, vecU=vecU, vecV=vecV)
+
+def udimOfFaces(data, faces):
+    """Return (udim, straddling) of faces. straddling is true for faces
+    crossing udim tile borders or lying outside the udim range(u in 0-10,
+    v >= 0), their udim is 0."""
+    faces = np.asarray(faces, dtype=np.int64)
+    counts = data.counts[faces]
+    fvIds = _ranges(data.offsets[faces], counts)
+    starts = np.cumsum(counts) - counts
+    udim = np.zeros(len(faces), dtype=np.int64)
+    straddling = np.ones(len(faces), dtype=bool)
+    valid = counts > 0
+    if not valid.any():
+        return udim, straddling
+    starts = starts[valid]
+    fu = data.faceU[fvIds]
+    fv = data.faceV[fvIds]
+    tu = np.floor(np.minimum.reduceat(fu, starts))
+    tv = np.floor(np.minimum.reduceat(fv, starts))
+    inside = ((np.maximum.reduceat(fu, starts) <= tu + 1) &
+              (np.maximum.reduceat(fv, starts) <= tv + 1) &
+              (tu >= 0) & (tu < 10) & (tv >= 0))
+    udim[valid] = np.where(inside, 1001 + tu + 10 * tv, 0)
+    straddling[valid] = ~inside
+    return udim, straddling
+
+def findOverlapPairsByUDIM(data, center, radius, faces, processes=0, threads=0):
+    """Faces in different udim tiles can't overlap, run the overlap check
+    on each tile by itself, in this thread or on a process or thread pool.
+    Faces crossing tile borders aren't tested, they are returned instead.
+    
+    return ({udim: (i, j)}, straddling face ids)"""
+    faces = np.asarray(faces, dtype=np.int64)
+    udim, straddling = udimOfFaces(data, faces)
+    inTile = faces[~straddling]
+    udim = udim[~straddling]
+    order = np.argsort(udim, kind='stable')
+    tiles, starts, counts = np.unique(udim[order], return_index=True, return_counts=True)
+    tileFaces = inTile[order]
+    tasks = [(tileFaces[start:start + count],)
+             for start, count in zip(starts.tolist(), counts.tolist())]
+    
+    results = _runTiles(_tileArrays(data, center, radius), tasks, processes, threads)
+    pairs = {}
+    for tile, (pairI, pairJ) in zip(tiles.tolist(), results):
+        pairs[tile] = uniquePairs(pairI, pairJ)
+    return pairs, faces[straddling]
+
+# on disk cache of overlap results, UVOVERLAP_CACHE_DIR overrides the location
+CACHE_DIR = os.environ.get('UVOVERLAP_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.uvOverlapCache'))
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# bump when a change of the overlap test changes its results
+CACHE_VERSION = 3
+
+def uvDataHash(data, *extra):
+    """Return a hex digest of face uv counts, face-vertex uv ids and uv
+    coordinates of data, plus any extra values."""
+    h = hashlib.sha1()
+    h.update(repr((CACHE_VERSION, len(data.counts), len(data.u)) + extra).encode())
+    h.update(data.counts.astype(np.int64).tobytes())
+    h.update(data.uvIds.astype(np.int64).tobytes())
+    h.update(data.u.astype(np.float32).tobytes())
+    h.update(data.v.astype(np.float32).tobytes())
+    return h.hexdigest()
+
+def loadCachedOverlap(key, cacheDir=None):
+    """Return cached (faces, pairs) of key, or None if not cached."""
+    path = os.path.join(cacheDir or CACHE_DIR, key + '.npz')
+    try:
+        with np.load(path) as cached:
+            result = (cached['faces'], cached['pairs'])
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+    # modification time is the last use, for evicting
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return result
+
+def saveCachedOverlap(key, faces, pairs, cacheDir=None, maxBytes=None):
+    """Store (faces, pairs) of key, then evict least recently used results
+    until the cache is no bigger than maxBytes."""
+    cacheDir = cacheDir or CACHE_DIR
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+    path = os.path.join(cacheDir, key + '.npz')
+    tmpPath = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmpPath, 'wb') as f:
+        np.savez(f, faces=faces, pairs=pairs)
+    os.replace(tmpPath, path)
+    evictOverlapCache(cacheDir, CACHE_MAX_BYTES if maxBytes is None else maxBytes)
+
+def evictOverlapCache(cacheDir=None, maxBytes=0):
+    """Remove least recently used results until the cache is no bigger than
+    maxBytes."""
+    cacheDir = cacheDir or CACHE_DIR
+    entries = []
+    for name in os.listdir(cacheDir):
+        if not name.endswith('.npz'):
+            continue
+        path = os.path.join(cacheDir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(entry[1] for entry in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+def findOverlapUVFaces(meshName, returnPairs=False, processes=0, threads=0, tiles=None,
+                       cache=False, cullNeighbours=False, raster=0, stacked=False,
+                       narrowPhase=None):
+    """Return sorted ids of overlapping faces, and a (n, 2) array of the
+    overlapping pairs if returnPairs is true.
+    processes, threads, tiles - run tiles of uv space on a pool of worker
+    processes or threads, see findOverlapPairsTiled
+    cache - True or a directory, reuse results of meshes with the same
+    topology and uvs from the on disk cache
+    cullNeighbours - skip neighbouring faces a line through a shared uv
+    separates, see dropNeighbourPairs
+    raster - approximate check, resolution of the coverage buffer finding
+    candidate faces, see rasterCandidateFaces
+    stacked - don't test shells stacked on a copy of themselves against each
+    other, see findStackedShells
+    narrowPhase - replaces checkCrossingEdgesBatch when not running tiles,
+    e.g. uvOverlapVulkan.VulkanNarrowPhase"""
+    meshfn = getMeshFn(meshName)
+    data = extractUVFaceData(meshfn)
+    if cache:
+        cacheDir = cache if isinstance(cache, str) else None
+        key = uvDataHash(data, raster, bool(stacked), bool(cullNeighbours))
+        cached = loadCachedOverlap(key, cacheDir)
+        if cached is None:
+            faces, pairs = findOverlapUVFaces(meshfn, True, processes, threads, tiles,
+                                              cullNeighbours=cullNeighbours, raster=raster,
+                                              stacked=stacked, narrowPhase=narrowPhase)
+            saveCachedOverlap(key, faces, pairs, cacheDir)
+        else:
+            faces, pairs = cached
+        return (faces, pairs) if returnPairs else faces
+    
+    center, radius = createBoundingCircle(data)
+    # Faces without uvs can't overlap anything, degenerate faces only add
+    # useless candidates
+    valid = overlapCandidateFaces(data, radius)[0]
+    if (processes > 0 or threads > 0) and not raster:
+        pairI, pairJ = findOverlapPairsTiled(data, center, radius, valid,
+                                             processes, threads, tiles, cullNeighbours,
+                                             stacked)
+    else:
+        pairs = [batch for batch, progress in
+                 iterOverlapPairs(data, center, radius, valid, cullNeighbours=cullNeighbours,
+                                  raster=raster, stacked=stacked, narrowPhase=narrowPhase)]
+        pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), np.int64)
+        pairI, pairJ = _sortPairs([pairs.T])
+    
+    faces = np.unique(np.concatenate((pairI, pairJ)))
+    if returnPairs:
+        return faces, np.column_stack((pairI, pairJ))
     return faces
+
+# number of candidate pairs tested between two yields of iterOverlapPairs
+OVERLAP_BATCH_SIZE = 1 << 16
+# part of the progress iterOverlapPairs reports for the broad phase
+BROAD_PHASE_SHARE = 0.3
+
+def iterOverlapPairs(data, center=None, radius=None, faces=None, batchSize=None,
+                     cancel=None, cullNeighbours=False, raster=0, stacked=False,
+                     narrowPhase=None):
+    """Generator testing candidate pairs batch by batch.
+    center, radius - bounding circles, computed if not given
+    faces - faces to test, see overlapCandidateFaces if None
+    batchSize - number of candidate pairs tested per batch
+    cancel - callable, stop as soon as it returns true
+    cullNeighbours - skip neighbouring faces that can't overlap, see
+    dropNeighbourPairs
+    raster - only test faces found with a coverage buffer of this resolution
+    stacked - skip pairs between shells stacked on a copy of themselves
+    narrowPhase - callable replacing checkCrossingEdgesBatch, taking the
+    same arguments
+    
+    yield (overlapping pairs (n, 2) of the batch, in no particular order,
+    fraction done), the broad phase yields empty batches to report its
+    progress"""
+    cancelled = lambda: cancel is not None and cancel()
+    if cancelled():
+        return
+    # the broad phase reports progress up to BROAD_PHASE_SHARE, stage by
+    # stage and chunk by chunk, so a cancel gets noticed within a chunk
+    empty = np.zeros((0, 2), np.int64)
+    if center is None or radius is None:
+        center, radius = createBoundingCircle(data)
+    if faces is None:
+        if cancelled():
+            return
+        faces = overlapCandidateFaces(data, radius)[0]
+    if raster:
+        if cancelled():
+            return
+        faces = rasterCandidateFaces(data, faces, raster)
+    if cancelled():
+        return
+    yield empty, BROAD_PHASE_SHARE * .1
+    grid = UVGrid(center, radius, faces)
+    chunks = []
+    for i, j, done in grid.iterCandidatePairs():
+        if cancelled():
+            return
+        keep = circlesOverlap(center, radius, i, j)
+        chunks.append((i[keep], j[keep]))
+        yield empty, BROAD_PHASE_SHARE * (.2 + .6 * done)
+    # pairs go in cell order, sorting them would only cost time here
+    pairI = np.concatenate([chunk[0] for chunk in chunks] + [empty[:, 0]])
+    pairJ = np.concatenate([chunk[1] for chunk in chunks] + [empty[:, 1]])
+    del chunks
+    if cullNeighbours:
+        if cancelled():
+            return
+        pairI, pairJ = dropNeighbourPairs(data, pairI, pairJ, faces)
+        yield empty, BROAD_PHASE_SHARE * .9
+    if stacked:
+        if cancelled():
+            return
+        shellData = computeUVShells(data)
+        stackOf = findStackedShells(data, shellData)
+        pairI, pairJ = dropStackedPairs(shellData[0], stackOf, pairI, pairJ)
+    if cancelled():
+        return
+    yield empty, BROAD_PHASE_SHARE
+    rays = createRays(data)
+    narrowPhase = narrowPhase or checkCrossingEdgesBatch
+    batchSize = batchSize or OVERLAP_BATCH_SIZE
+    total = len(pairI)
+    for start in range(0, total, batchSize):
+        if cancelled():
+            return
+        i = pairI[start:start + batchSize]
+        j = pairJ[start:start + batchSize]
+        hit = narrowPhase(data, i, j, rays)
+        done = float(min(start + batchSize, total)) / total
+        yield (np.column_stack((i[hit], j[hit])),
+               BROAD_PHASE_SHARE + (1. - BROAD_PHASE_SHARE) * done)
+    if total == 0:
+        yield empty, 1.
+
+def iterOverlapUVFaces(meshName, batchSize=None, cancel=None, cullNeighbours=False,
+                       raster=0, stacked=False):
+    """Generator version of findOverlapUVFaces for interactive use, yielding
+    overlapping pairs as they are found.
+    
+    for pairs, progress in iterOverlapUVFaces('pCube1', cancel=userCancelled):
+        highlight(pairs)
+        updateProgressBar(progress)
+    
+    yield (overlapping pairs (n, 2), fraction done)"""
+    meshfn = getMeshFn(meshName)
+    data = extractUVFaceData(meshfn)
+    for result in iterOverlapPairs(data, batchSize=batchSize, cancel=cancel,
+                                   cullNeighbours=cullNeighbours, raster=raster,
+                                   stacked=stacked):
+        yield result
+
+def faceNames(meshName, faces):
+    """Return one face name of meshName, i.e. 'pCube1.f[3]', for every face
+    id."""
+    return ['%s.f[%d]' % (meshName, fid)
+            for fid in np.asarray(faces, dtype=np.int64).tolist()]
+
+def faceComponentNames(meshName, faces):
+    """Return compact face names of meshName, i.e. ['pCube1.f[0:3]', ...],
+    for sorted face ids."""
+    faces = np.asarray(faces, dtype=np.int64)
+    if len(faces) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(faces) != 1)
+    starts = faces[np.concatenate(([0], breaks + 1))].tolist()
+    ends = faces[np.concatenate((breaks, [len(faces) - 1]))].tolist()
+    return ['%s.f[%d]' % (meshName, s) if s == e else '%s.f[%d:%d]' % (meshName, s, e)
+            for s, e in zip(starts, ends)]
+
+def faceSelection(meshName, faces):
+    """Return MSelectionList holding given face ids of meshName, built with
+    a single MFnSingleIndexedComponent."""
+    meshfn = getMeshFn(meshName)
+    compFn = om.MFnSingleIndexedComponent()
+    comp = compFn.create(om.MFn.kMeshPolygonComponent)
+    compFn.addElements(np.asarray(faces, dtype=np.int64).tolist())
+    selList = om.MSelectionList()
+    selList.add((meshfn.dagPath(), comp))
+    return selList
+
+def getOverlapUVFaces(meshName, processes=0, threads=0, tiles=None, cache=False):
+    """Return names of overlapping faces, one per face
+    processes, threads, tiles - run tiles of uv space on a pool of worker
+    processes or threads, see findOverlapPairsTiled
+    cache - reuse results from the on disk cache, see findOverlapUVFaces"""
+    meshfn = getMeshFn(meshName)
+    faces = findOverlapUVFaces(meshfn, False, processes, threads, tiles, cache)
+    return faceNames(meshfn.name(), faces)
+
+def selectOverlapUVFaces(meshName, processes=0, threads=0, tiles=None, cache=False):
+    """Select overlapping faces, return the selection list"""
+    meshfn = getMeshFn(meshName)
+    faces = findOverlapUVFaces(meshfn, False, processes, threads, tiles, cache)
+    selList = faceSelection(meshfn, faces)
+    om.MGlobal.setActiveSelectionList(selList)
+    return selList
+
+def getDegenerateUVFaces(meshName):
+    """Return faces with (almost) no uv area, the faces left out of the
+    overlap check"""
+    meshfn = getMeshFn(meshName)
+    data = extractUVFaceData(meshfn)
+    return faceNames(data.name, findDegenerateUVFaces(data))
+
+def getStackedShells(meshName):
+    """Return groups of shells stacked on top of each other, a list of the
+    faces of every shell for each group, see findStackedShells"""
+    meshfn = getMeshFn(meshName)
+    data = extractUVFaceData(meshfn)
+    shellOf, numShells = computeUVShells(data)
+    stackOf = findStackedShells(data, (shellOf, numShells))
+    mapped = np.flatnonzero(shellOf >= 0)
+    faces = mapped[stackOf[shellOf[mapped]] >= 0]
+    faces = faces[np.argsort(shellOf[faces], kind='stable')]
+    breaks = np.flatnonzero(np.diff(shellOf[faces]) != 0) + 1
+    groups = [[] for stack in range(stackOf.max() + 1 if numShells else 0)]
+    for shellFaces in np.split(faces, breaks) if len(faces) else []:
+        groups[stackOf[shellOf[shellFaces[0]]]].append(
+            faceNames(data.name, shellFaces))
+    return groups
+
+def getOverlapUVFacesByUDIM(meshName, processes=0, threads=0):
+    """Return ({udim: overlapping faces}, faces crossing udim borders)
+    processes, threads - check udim tiles on a pool of worker processes or
+    threads"""
+    meshfn = getMeshFn(meshName)
+    data = extractUVFaceData(meshfn)
+    
+    center, radius = createBoundingCircle(data)
+    valid = overlapCandidateFaces(data, radius)[0]
+    pairs, straddling = findOverlapPairsByUDIM(data, center, radius, valid,
+                                               processes, threads)
+    faces = {}
+    for udim, (pairI, pairJ) in pairs.items():
+        faces[udim] = faceNames(data.name, np.unique(np.concatenate((pairI, pairJ))))
+    return faces, faceNames(data.name, straddling)
+
+def findAtlasOverlapPairs(meshNames, uvSet='', processes=0, threads=0):
+    """Check the uvs of many meshes sharing one uv space against each other
+    and themselves. All meshes go into one AtlasUVFaceData, so there is a
+    single broad phase over every face instead of a run per pair of meshes.
+    processes, threads - run tiles on a pool, see findOverlapPairsTiled
+    
+    return (AtlasUVFaceData, overlapping pairs (n, 2) of global face ids)"""
+    data = AtlasUVFaceData(extractUVFaceData(getMeshFn(name), uvSet)
+                           for name in meshNames)
+    center, radius = createBoundingCircle(data)
+    valid = overlapCandidateFaces(data, radius)[0]
+    if processes > 0 or threads > 0:
+        pairI, pairJ = findOverlapPairsTiled(data, center, radius, valid,
+                                             processes, threads)
+        return data, np.column_stack((pairI, pairJ))
+    pairs = [batch.T for batch, progress in iterOverlapPairs(data, center, radius, valid)]
+    return data, np.column_stack(_sortPairs(pairs))
+
+def getAtlasOverlapUVFaces(meshNames, crossObjectOnly=False, processes=0, threads=0):
+    """Return overlapping faces of all meshes sharing an atlas
+    crossObjectOnly - only faces overlapping a face of another mesh"""
+    data, pairs = findAtlasOverlapPairs(meshNames, processes=processes, threads=threads)
+    if crossObjectOnly:
+        pairs = pairs[data.meshOf(pairs[:, 0]) != data.meshOf(pairs[:, 1])]
+    mesh, faces = data.localFaces(np.unique(pairs))
+    result = []
+    for k in np.unique(mesh).tolist():
+        result.extend(faceNames(data.names[k], faces[mesh == k]))
+    return result
+
+def getAtlasCrossOverlaps(meshNames, processes=0, threads=0):
+    """Return {(meshA, meshB): overlapping pairs (n, 2) of face ids of meshA
+    and meshB} for every two meshes whose uvs overlap, meshA before meshB in
+    meshNames"""
+    data, pairs = findAtlasOverlapPairs(meshNames, processes=processes, threads=threads)
+    pairs = np.sort(pairs, axis=1)
+    meshI, faceI = data.localFaces(pairs[:, 0])
+    meshJ, faceJ = data.localFaces(pairs[:, 1])
+    cross = meshI != meshJ
+    meshI, faceI, meshJ, faceJ = meshI[cross], faceI[cross], meshJ[cross], faceJ[cross]
+    order = np.lexsort((meshJ, meshI))
+    meshI, faceI, meshJ, faceJ = meshI[order], faceI[order], meshJ[order], faceJ[order]
+    breaks = np.flatnonzero((np.diff(meshI) != 0) | (np.diff(meshJ) != 0)) + 1
+    result = {}
+    for start, end in zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [len(meshI)]))):
+        if start == end:
+            continue
+        key = (data.names[meshI[start]], data.names[meshJ[start]])
+        result[key] = np.column_stack((faceI[start:end], faceJ[start:end]))
+    return result
+
+class OverlapSession(object):
+    """Keep the uvs, the spatial index and the overlapping pairs of a mesh
+    around, so a few edited uvs can be re-checked without testing the whole
+    mesh again.
+    
+    session = OverlapSession('pCube1')
+    cmds.polyEditUV('pCube1.map[12]', u=-0.057, v=-0.109)
+    session.update(uvIds=[12])
+    cmds.select(session.getOverlapFaces(), r=1)
+    
+    Edits changing uv ids or topology(cut, sew, new faces) need rebuild()."""
+    # rebuild the grid once this fraction of faces have moved out of it
+    REBUILD_FRACTION = 0.05
+    # read uvs one by one with getUV below this number of uvs
+    SINGLE_UV_READS = 1000
+
+    def __init__(self, meshName, uvSet=''):
+        self.meshfn = getMeshFn(meshName)
+        self.uvSet = uvSet
+        self.rebuild()
+
+    def rebuild(self):
+        """Extract the mesh and check all faces again."""
+        self.data = extractUVFaceData(self.meshfn, self.uvSet)
+        data = self.data
+        self.faceOf = data.faceIndices()
+        self.rays = createRays(data)
+        self._prev = previousFaceVertex(data)
+        # face-vertices of every uv id
+        self._uvFaceVerts = np.argsort(data.uvIds, kind='stable')
+        self._uvCounts = np.bincount(data.uvIds, minlength=len(data.u))
+        self._uvStarts = np.cumsum(self._uvCounts) - self._uvCounts
+        
+        self.center, self.radius = createBoundingCircle(data)
+        self._mapped = data.counts > 0
+        # faces taking part, with uvs and not degenerate
+        self._valid = self._mapped.copy()
+        self._valid[findDegenerateUVFaces(data, radius=self.radius)] = False
+        self.grid = UVGrid(self.center, self.radius, np.flatnonzero(self._valid))
+        self._moved = np.zeros(data.numFaces, dtype=bool)
+        
+        pairI, pairJ = self.grid.candidatePairs()
+        keep = circlesOverlap(self.center, self.radius, pairI, pairJ)
+        pairI = pairI[keep]
+        pairJ = pairJ[keep]
+        hit = checkCrossingEdgesBatch(data, pairI, pairJ, self.rays)
+        self.pairs = (pairI[hit], pairJ[hit])
+
+    def _readUVs(self, uvIds):
+        """Refresh given uvs from the mesh."""
+        data = self.data
+        if len(uvIds) > self.SINGLE_UV_READS:
+            u, v = self.meshfn.getUVs(self.uvSet)
+            data.u[uvIds] = np.asarray(u, dtype=np.float32)[uvIds]
+            data.v[uvIds] = np.asarray(v, dtype=np.float32)[uvIds]
+            return
+        for uvId in uvIds.tolist():
+            data.u[uvId], data.v[uvId] = self.meshfn.getUV(uvId, self.uvSet)
+
+    def update(self, uvIds=None, faces=None):
+        """Re-read the given uvs, and the uvs of the given faces, then re-test
+        only the pairs involving faces using them.
+        
+        return overlapping pairs (i, j)"""
+        data = self.data
+        changed = []
+        if uvIds is not None:
+            changed.append(np.asarray(uvIds, dtype=np.int64))
+        if faces is not None:
+            faces = np.asarray(faces, dtype=np.int64)
+            changed.append(data.uvIds[_ranges(data.offsets[faces], data.counts[faces])])
+        if not changed:
+            return self.pairs
+        changed = np.unique(np.concatenate(changed))
+        self._readUVs(changed)
+        
+        # face-vertices using changed uvs, then every face-vertex of their faces
+        fvIds = self._uvFaceVerts[_ranges(self._uvStarts[changed], self._uvCounts[changed])]
+        dirty = np.unique(self.faceOf[fvIds])
+        dirty = dirty[self._mapped[dirty]]
+        fvIds = _ranges(data.offsets[dirty], data.counts[dirty])
+        data.faceU[fvIds] = data.u[data.uvIds[fvIds]]
+        data.faceV[fvIds] = data.v[data.uvIds[fvIds]]
+        origU, origV, vecU, vecV = self.rays
+        origU[fvIds] = data.faceU[fvIds]
+        origV[fvIds] = data.faceV[fvIds]
+        prev = self._prev[fvIds]
+        vecU[fvIds] = origU[prev] - origU[fvIds]
+        vecV[fvIds] = origV[prev] - origV[fvIds]
+        self.center[dirty], self.radius[dirty] = createBoundingCircle(data, dirty)
+        self._valid[dirty] = True
+        self._valid[findDegenerateUVFaces(data, dirty, self.radius)] = False
+        
+        # drop old pairs of dirty faces
+        isDirty = np.zeros(data.numFaces, dtype=bool)
+        isDirty[dirty] = True
+        pairI, pairJ = self.pairs
+        keep = ~(isDirty[pairI] | isDirty[pairJ])
+        pairI = pairI[keep]
+        pairJ = pairJ[keep]
+        
+        self._moved[dirty] = True
+        moved = np.flatnonzero(self._moved)
+        dirty = dirty[self._valid[dirty]]
+        if len(moved) > self.REBUILD_FRACTION * data.numFaces:
+            self.grid = UVGrid(self.center, self.radius, np.flatnonzero(self._valid))
+            self._moved[:] = False
+            candI, candJ = self.grid.query(self.center, self.radius, dirty)
+        else:
+            # the grid still holds the old cells of moved faces, skip them
+            # there and test moved faces against each other instead
+            candI, candJ = self.grid.query(self.center, self.radius, dirty)
+            keep = ~self._moved[candJ]
+            moved = moved[self._valid[moved]]
+            movedGrid = UVGrid(self.center, self.radius, moved, self.grid.cellSize)
+            movedI, movedJ = movedGrid.query(self.center, self.radius, dirty)
+            candI = np.concatenate((candI[keep], movedI))
+            candJ = np.concatenate((candJ[keep], movedJ))
+        candI, candJ = uniquePairs(candI, candJ)
+        keep = circlesOverlap(self.center, self.radius, candI, candJ)
+        candI = candI[keep]
+        candJ = candJ[keep]
+        hit = checkCrossingEdgesBatch(data, candI, candJ, self.rays)
+        
+        n = data.numFaces
+        key = np.concatenate((pairI * n + pairJ, candI[hit] * n + candJ[hit]))
+        key.sort()
+        self.pairs = (key // n, key % n)
+        return self.pairs
+
+    def degenerateFaceIds(self):
+        """Return ids of degenerate faces left out of the check"""
+        return np.flatnonzero(self._mapped & ~self._valid)
+
+    def faceIds(self):
+        """Return sorted ids of overlapping faces"""
+        return np.unique(np.concatenate(self.pairs))
+
+    def getOverlapFaces(self):
+        """Return overlapping faces"""
+        return faceNames(self.data.name, self.faceIds())
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Mack Stone
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+# Benchmark uvOverlap.py on synthetic uv layouts, no Maya needed.
+#
+# how to use:
+#
+# python uvOverlapBench.py
+# python uvOverlapBench.py --layouts scattered stacked --sizes 1000 100000 2000000
+#
+# or from python
+#
+# import uvOverlapBench
+# uvOverlapBench.runBenchmark(sizes=(1000, 10000))
+
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+import meshData
+import uvOverlap
+
+
+def shellMesh(origins, shellSize, quads=8, name='benchMesh'):
+    """Return a meshData.MeshData made of square shells of quads x quads
+    faces, shell s has its lower left corner at origins[s]. Its points are
+    the uvs, lying flat at z = 0."""
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    numShells = len(origins)
+    g = np.arange(quads + 1) / float(quads) * shellSize
+    gu, gv = np.meshgrid(g, g)
+    u = (origins[:, 0, None] + gu.ravel()).ravel()
+    v = (origins[:, 1, None] + gv.ravel()).ravel()
+    row, col = np.divmod(np.arange(quads * quads), quads)
+    corner = row * (quads + 1) + col
+    quad = np.stack((corner, corner + 1, corner + quads + 2, corner + quads + 1), axis=1)
+    uvIds = (quad.ravel() + (np.arange(numShells) * (quads + 1) ** 2)[:, None]).ravel()
+    counts = np.full(numShells * quads * quads, 4)
+    points = np.column_stack((u, v, np.zeros(len(u))))
+    return meshData.MeshData(points, counts, uvIds, u, v, counts, uvIds, name=name)
+
+def gridLayout(numFaces, seed=0):
+    """One shell covering 0-1, no overlaps."""
+    quads = max(int(np.sqrt(numFaces)), 1)
+    return shellMesh([[0., 0.]], 1., quads, 'grid')
+
+def scatteredLayout(numFaces, seed=0, quads=8, shellSize=0.02):
+    """Shells of quads x quads faces scattered over a square growing with
+    their number, about a third of them touching a neighbour. Shells keep
+    their size so face edges stay well above the parallel edge tolerance of
+    checkCrossingEdges."""
+    rng = np.random.default_rng(seed)
+    numShells = max(numFaces // (quads * quads), 1)
+    spread = 2. * np.sqrt(numShells) * shellSize
+    return shellMesh(rng.random((numShells, 2)) * (spread - shellSize), shellSize, quads,
+                     'scattered')
+
+def stackedLayout(numFaces, seed=0, quads=8, stack=4, loose=0.25):
+    """Shells laid out on a clean grid, stack copies of each on top of one
+    another, like mirrored or instanced parts. Copies are nudged by less than
+    uvOverlap.STACK_TOLERANCE of their size, so findStackedShells still
+    matches them while their edges cross. About loose of the copies are
+    nudged by a fraction of a face instead, they match no stack and still
+    overlap with stacked=True."""
+    rng = np.random.default_rng(seed)
+    numShells = max(numFaces // (quads * quads * stack), 1)
+    side = int(np.ceil(np.sqrt(numShells)))
+    shellSize = 1. / side
+    cells = np.arange(numShells)
+    origins = np.column_stack((cells % side, cells // side)) * shellSize
+    nudge = rng.random((numShells * stack, 2)) * shellSize * uvOverlap.STACK_TOLERANCE * .5
+    off = rng.random(numShells * stack) < loose
+    nudge[off] = rng.random((off.sum(), 2)) * shellSize / quads * .5
+    origins = np.repeat(origins, stack, axis=0) + nudge
+    return shellMesh(origins, shellSize * .9, quads, 'stacked')
+
+def udimLayout(numFaces, seed=0, quads=8, tilesU=10, tilesV=2):
+    """Scattered shells spread over tilesU x tilesV udim tiles."""
+    rng = np.random.default_rng(seed)
+    numShells = max(numFaces // (quads * quads), 1)
+    perTile = max(numShells // (tilesU * tilesV), 1)
+    shellSize = 0.5 / np.sqrt(perTile)
+    origins = rng.random((numShells, 2)) * (1. - shellSize)
+    tile = rng.integers(0, tilesU * tilesV, numShells)
+    origins[:, 0] += tile % tilesU
+    origins[:, 1] += tile // tilesU
+    return shellMesh(origins, shellSize, quads, 'udim')
+
+LAYOUTS = {
+    'grid': gridLayout,
+    'scattered': scatteredLayout,
+    'stacked': stackedLayout,
+    'udim': udimLayout,
+}
+SIZES = (1000, 10000, 100000, 1000000, 2000000)
+
+class _Stage(object):
+    """Time and peak traced memory of a block of code, as report[name] in
+    seconds and report[name + 'MB']."""
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.report[self.name] = time.perf_counter() - self.start
+        self.report[self.name + 'MB'] = tracemalloc.get_traced_memory()[1] / 1048576.
+
+def benchmarkMesh(mesh):
+    """Run the overlap check on mesh stage by stage, then end to end through
+    getOverlapUVFaces.
+    
+    return dict of seconds and peak traced memory in MB per stage, see
+    STAGES, and candidate and overlapping pair counts"""
+    report = {'faces': mesh.numPolygons}
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start()
+    try:
+        with _Stage(report, 'extract'):
+            data = uvOverlap.extractUVFaceData(mesh)
+        with _Stage(report, 'circles'):
+            center, radius = uvOverlap.createBoundingCircle(data)
+        with _Stage(report, 'degenerate'):
+            valid, degenerate = uvOverlap.overlapCandidateFaces(data, radius)
+        report['degenerates'] = len(degenerate)
+        with _Stage(report, 'broad'):
+            pairI, pairJ = uvOverlap.findCandidatePairs(center, radius, valid)
+        report['candidates'] = len(pairI)
+        with _Stage(report, 'narrow'):
+            hit = uvOverlap.checkCrossingEdgesBatch(data, pairI, pairJ)
+        report['overlaps'] = int(hit.sum())
+        del data, center, radius, pairI, pairJ, hit
+        with _Stage(report, 'total'):
+            faces = uvOverlap.getOverlapUVFaces(mesh)
+        report['names'] = len(faces)
+    finally:
+        if not started:
+            tracemalloc.stop()
+    return report
+
+STAGES = ('extract', 'circles', 'degenerate', 'broad', 'narrow', 'total')
+COLUMNS = (('layout', 'faces', 'extract', 'circles', 'degenerate', 'degenerates', 'broad',
+            'candidates', 'narrow', 'overlaps', 'total') +
+           tuple(stage + 'MB' for stage in STAGES))
+
+def runBenchmark(layouts=None, sizes=SIZES, seed=0, out=None):
+    """Benchmark every layout at every size, print a table to out(stdout).
+    
+    return list of report dicts"""
+    out = out or sys.stdout
+    reports = []
+    out.write(''.join('%13s' % col for col in COLUMNS) + '\n')
+    for layout in layouts or sorted(LAYOUTS):
+        for size in sizes:
+            mesh = LAYOUTS[layout](size, seed)
+            report = benchmarkMesh(mesh)
+            report['layout'] = layout
+            reports.append(report)
+            row = []
+            for col in COLUMNS:
+                value = report[col]
+                row.append('%13.3f' % value if isinstance(value, float) else '%13s' % value)
+            out.write(''.join(row) + '\n')
+            out.flush()
+    return reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark uvOverlap.py on synthetic uv layouts.')
+    parser.add_argument('--layouts', nargs='+', choices=sorted(LAYOUTS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    runBenchmark(args.layouts, args.sizes, args.seed)
+
+if __name__ == '__main__':
+    main()
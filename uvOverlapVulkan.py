@@ -0,0 +1,356 @@
+# --------------------------------------------------------------------------------
+# Copyright (c) 2018 Shi Chi(Mack Stone). All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# --------------------------------------------------------------------------------
+
+# Vulkan compute narrow phase for uvOverlap.py, checkCrossingEdges runs in
+# plugins/uvOverlapNarrow.comp, one candidate pair per invocation, overlapping
+# pairs come back as a compacted hit list.
+#
+# The device needs shaderFloat64. Software drivers work too, e.g. lavapipe on
+# machines without a GPU:
+#
+# VK_ICD_FILENAMES=/usr/share/vulkan/icd.d/lvp_icd.x86_64.json mayapy ...
+#
+# how to use:
+#
+# import uvOverlap, uvOverlapVulkan
+# with uvOverlapVulkan.VulkanNarrowPhase() as narrowPhase:
+#     faces = uvOverlap.findOverlapUVFaces('pSphere1', narrowPhase=narrowPhase)
+#
+# The compiled plugins/uvOverlapNarrow.spv is committed next to the shader,
+# like the other plugins' ones, so nothing gets compiled or written at run
+# time. After editing the shader rebuild it with compileShader, which needs
+# glslangValidator or glslc from the Vulkan SDK, and check the result against
+# the CPU path with uvOverlapVulkanCheck.py.
+
+import os
+import subprocess
+
+import cffi
+import numpy as np
+from vulkan import *
+
+import uvOverlap
+
+
+SHADER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'plugins', 'uvOverlapNarrow.comp')
+SPV_FILE = os.path.splitext(SHADER_FILE)[0] + '.spv'
+WORKGROUP_SIZE = 256  # Workgroup size in compute shader.
+# candidate pairs sent in one dispatch
+VULKAN_BATCH_SIZE = 1 << 20
+
+mffi = cffi.FFI()
+mffi.cdef('''
+struct ubo {
+int numPairs;
+};
+'''
+)
+
+
+def compileShader(shaderFile=SHADER_FILE, spvFile=None):
+    """Compile a glsl compute shader to SPIR-V, return the .spv file. Only
+    needed after editing the shader, VulkanNarrowPhase loads the committed
+    .spv."""
+    if spvFile is None:
+        spvFile = os.path.splitext(shaderFile)[0] + '.spv'
+    compilers = (['glslangValidator', '-V', shaderFile, '-o', spvFile],
+                 ['glslc', '-fshader-stage=compute', shaderFile, '-o', spvFile])
+    for command in compilers:
+        try:
+            subprocess.check_output(command, stderr=subprocess.STDOUT)
+            return spvFile
+        except OSError:
+            # compiler not installed, try the next one
+            continue
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError('Failed to compile %s:\n%s' % (shaderFile, e.output))
+    raise RuntimeError("Can't compile %s, glslangValidator or glslc from the Vulkan SDK "
+                       "has to be on the PATH" % shaderFile)
+
+def findBestComputeQueue(physicalDevice):
+    queueFamilyProperties = vkGetPhysicalDeviceQueueFamilyProperties(physicalDevice)
+
+    # a compute only queue first, then any queue with compute
+    for i, queueFamily in enumerate(queueFamilyProperties):
+        maskedFlags = ~(VK_QUEUE_TRANSFER_BIT | VK_QUEUE_SPARSE_BINDING_BIT) & queueFamily.queueFlags
+
+        if not (VK_QUEUE_GRAPHICS_BIT & maskedFlags) and VK_QUEUE_COMPUTE_BIT & maskedFlags:
+            return i
+
+    for i, queueFamily in enumerate(queueFamilyProperties):
+        maskedFlags = ~(VK_QUEUE_TRANSFER_BIT | VK_QUEUE_SPARSE_BINDING_BIT) & queueFamily.queueFlags
+
+        if VK_QUEUE_COMPUTE_BIT & maskedFlags:
+            return i
+
+    return -1
+
+def findMemoryType(physicalDevice, typeFilter, properties):
+    memProperties = vkGetPhysicalDeviceMemoryProperties(physicalDevice)
+
+    for i, prop in enumerate(memProperties.memoryTypes):
+        if (typeFilter & (1 << i)) and ((prop.propertyFlags & properties) == properties):
+            return i
+
+    return -1
+
+
+class VulkanNarrowPhase(object):
+    """Callable replacing uvOverlap.checkCrossingEdgesBatch, i.e.
+    hit = narrowPhase(data, pairI, pairJ, rays)
+
+    Rays and faces of a UVFaceData are uploaded once and kept on the device
+    until another UVFaceData comes along, candidate pairs go in batches of
+    VULKAN_BATCH_SIZE.
+    deviceName - use the first device whose name holds this, e.g. 'llvmpipe'
+    for lavapipe, the first device with shaderFloat64 if None
+    spvFile - compiled plugins/uvOverlapNarrow.comp"""
+
+    def __init__(self, deviceName=None, spvFile=SPV_FILE):
+        self.data = None
+        self.buffers = {}
+
+        appInfo = VkApplicationInfo(
+            pApplicationName='uvOverlap',
+            applicationVersion=VK_MAKE_VERSION(1, 0, 0),
+            pEngineName='maya py api 2.0',
+            engineVersion=VK_MAKE_VERSION(1, 0, 0),
+            apiVersion=VK_API_VERSION_1_0
+        )
+        self.instance = vkCreateInstance(VkInstanceCreateInfo(pApplicationInfo=appInfo), None)
+
+        self.physicalDevice = None
+        for physicalDevice in vkEnumeratePhysicalDevices(self.instance):
+            name = vkGetPhysicalDeviceProperties(physicalDevice).deviceName
+            if not isinstance(name, str):
+                name = ffi.string(name).decode()
+            if deviceName is not None and deviceName not in name:
+                continue
+            if vkGetPhysicalDeviceFeatures(physicalDevice).shaderFloat64:
+                self.physicalDevice = physicalDevice
+                break
+        if self.physicalDevice is None:
+            vkDestroyInstance(self.instance, None)
+            raise RuntimeError('No Vulkan device with shaderFloat64 found')
+
+        self.queueFamilyIndex = findBestComputeQueue(self.physicalDevice)
+        deviceQueueCreateInfo = VkDeviceQueueCreateInfo(
+            queueFamilyIndex=self.queueFamilyIndex,
+            queueCount=1,
+            pQueuePriorities=[1.0,]
+        )
+        deviceCreateInfo = VkDeviceCreateInfo(
+            pQueueCreateInfos=[deviceQueueCreateInfo,],
+            enabledExtensionCount=0,
+            enabledLayerCount=0,
+            pEnabledFeatures=VkPhysicalDeviceFeatures(shaderFloat64=VK_TRUE)
+        )
+        self.device = vkCreateDevice(self.physicalDevice, deviceCreateInfo, None)
+        self.queue = vkGetDeviceQueue(self.device, self.queueFamilyIndex, 0)
+
+        with open(spvFile, 'rb') as sf:
+            shaderCode = sf.read()
+        self.shaderModule = vkCreateShaderModule(self.device, VkShaderModuleCreateInfo(
+            codeSize=len(shaderCode),
+            pCode=shaderCode
+        ), None)
+
+        # edges, faces, pairs, hits and the ubo
+        descriptorTypes = [VK_DESCRIPTOR_TYPE_STORAGE_BUFFER] * 4 + [VK_DESCRIPTOR_TYPE_UNIFORM_BUFFER]
+        descriptorSetLayoutBindings = [
+            VkDescriptorSetLayoutBinding(
+                binding=binding,
+                descriptorType=descriptorType,
+                descriptorCount=1,
+                stageFlags=VK_SHADER_STAGE_COMPUTE_BIT
+            ) for binding, descriptorType in enumerate(descriptorTypes)
+        ]
+        self.descriptorSetLayout = vkCreateDescriptorSetLayout(
+            self.device, VkDescriptorSetLayoutCreateInfo(pBindings=descriptorSetLayoutBindings), None)
+
+        descriptorPoolSizes = [
+            VkDescriptorPoolSize(type=VK_DESCRIPTOR_TYPE_STORAGE_BUFFER, descriptorCount=4),
+            VkDescriptorPoolSize(type=VK_DESCRIPTOR_TYPE_UNIFORM_BUFFER, descriptorCount=1)
+        ]
+        self.descriptorPool = vkCreateDescriptorPool(self.device, VkDescriptorPoolCreateInfo(
+            maxSets=1,
+            pPoolSizes=descriptorPoolSizes
+        ), None)
+        self.descriptorSet = vkAllocateDescriptorSets(self.device, VkDescriptorSetAllocateInfo(
+            descriptorPool=self.descriptorPool,
+            pSetLayouts=[self.descriptorSetLayout,]
+        ))[0]
+
+        self.pipelineLayout = vkCreatePipelineLayout(self.device, VkPipelineLayoutCreateInfo(
+            pSetLayouts=[self.descriptorSetLayout,]
+        ), None)
+        shaderStage = VkPipelineShaderStageCreateInfo(
+            stage=VK_SHADER_STAGE_COMPUTE_BIT,
+            module=self.shaderModule,
+            pName='main'
+        )
+        self.pipeline = vkCreateComputePipelines(self.device, None, 1, VkComputePipelineCreateInfo(
+            stage=shaderStage,
+            layout=self.pipelineLayout
+        ), None)
+
+        self.commandPool = vkCreateCommandPool(self.device, VkCommandPoolCreateInfo(
+            flags=VK_COMMAND_POOL_CREATE_RESET_COMMAND_BUFFER_BIT,
+            queueFamilyIndex=self.queueFamilyIndex
+        ), None)
+        self.cmdBuffer = vkAllocateCommandBuffers(self.device, VkCommandBufferAllocateInfo(
+            commandPool=self.commandPool,
+            level=VK_COMMAND_BUFFER_LEVEL_PRIMARY,
+            commandBufferCount=1
+        ))[0]
+
+        # pairs, hits and ubo only change size with the batch size
+        self.ubo = mffi.new('struct ubo *', [0])
+        self.createBuffer(2, 'pairs', VULKAN_BATCH_SIZE * 8)
+        self.createBuffer(3, 'hits', (VULKAN_BATCH_SIZE + 1) * 4)
+        self.createBuffer(4, 'ubo', mffi.sizeof(self.ubo[0]), VK_BUFFER_USAGE_UNIFORM_BUFFER_BIT)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.destroy()
+
+    def createBuffer(self, binding, name, size, usage=VK_BUFFER_USAGE_STORAGE_BUFFER_BIT):
+        """Create a host visible buffer and bind it to the descriptor set,
+        replacing the buffer of the same name."""
+        self.destroyBuffer(name)
+        size = max(size, 16)
+        buffer = vkCreateBuffer(self.device, VkBufferCreateInfo(
+            size=size,
+            usage=usage,
+            sharingMode=VK_SHARING_MODE_EXCLUSIVE,
+            pQueueFamilyIndices=[self.queueFamilyIndex,]
+        ), None)
+        memRequirements = vkGetBufferMemoryRequirements(self.device, buffer)
+        memory = vkAllocateMemory(self.device, VkMemoryAllocateInfo(
+            allocationSize=memRequirements.size,
+            memoryTypeIndex=findMemoryType(self.physicalDevice, memRequirements.memoryTypeBits,
+                                           VK_MEMORY_PROPERTY_HOST_VISIBLE_BIT | VK_MEMORY_PROPERTY_HOST_COHERENT_BIT)
+        ), None)
+        vkBindBufferMemory(self.device, buffer, memory, 0)
+        self.buffers[name] = (buffer, memory, size)
+
+        descriptorType = (VK_DESCRIPTOR_TYPE_UNIFORM_BUFFER if usage == VK_BUFFER_USAGE_UNIFORM_BUFFER_BIT
+                          else VK_DESCRIPTOR_TYPE_STORAGE_BUFFER)
+        writeDescriptorSet = VkWriteDescriptorSet(
+            dstSet=self.descriptorSet,
+            dstBinding=binding,
+            dstArrayElement=0,
+            descriptorCount=1,
+            descriptorType=descriptorType,
+            pBufferInfo=VkDescriptorBufferInfo(buffer=buffer, offset=0, range=size)
+        )
+        vkUpdateDescriptorSets(self.device, 1, [writeDescriptorSet,], 0, None)
+
+    def destroyBuffer(self, name):
+        if name in self.buffers:
+            buffer, memory, size = self.buffers.pop(name)
+            vkDestroyBuffer(self.device, buffer, None)
+            vkFreeMemory(self.device, memory, None)
+
+    def write(self, name, array):
+        """Copy a contiguous numpy array to the start of a buffer."""
+        buffer, memory, size = self.buffers[name]
+        array = np.ascontiguousarray(array)
+        dataPtr = vkMapMemory(self.device, memory, 0, array.nbytes, 0)
+        ffi.memmove(dataPtr, ffi.cast('char*', array.ctypes.data), array.nbytes)
+        vkUnmapMemory(self.device, memory)
+
+    def read(self, name, array, offset=0):
+        """Fill a numpy array from a buffer, starting at offset bytes."""
+        buffer, memory, size = self.buffers[name]
+        dataPtr = vkMapMemory(self.device, memory, offset, array.nbytes, 0)
+        ffi.memmove(ffi.cast('char*', array.ctypes.data), dataPtr, array.nbytes)
+        vkUnmapMemory(self.device, memory)
+
+    def upload(self, data, rays=None):
+        """Send the rays and faces of a UVFaceData to the device."""
+        if rays is None:
+            rays = uvOverlap.createRays(data)
+        if len(data.uvIds) >= 2 ** 31:
+            raise ValueError('Too many face-vertices for the Vulkan narrow phase')
+        edges = np.column_stack(rays).astype(np.float64)
+        faces = np.column_stack((data.offsets[:-1], data.counts)).astype(np.int32)
+        self.createBuffer(0, 'edges', edges.nbytes)
+        self.createBuffer(1, 'faces', faces.nbytes)
+        self.write('edges', edges)
+        self.write('faces', faces)
+        self.data = data
+
+    def __call__(self, data, pairI, pairJ, rays=None):
+        """Return bool array, true for pairs with crossing edges"""
+        if data is not self.data:
+            self.upload(data, rays)
+        pairs = np.column_stack((pairI, pairJ)).astype(np.int32)
+        hit = np.zeros(len(pairs), dtype=bool)
+        for start in range(0, len(pairs), VULKAN_BATCH_SIZE):
+            batch = pairs[start:start + VULKAN_BATCH_SIZE]
+            self.ubo.numPairs = len(batch)
+            uboPtr = vkMapMemory(self.device, self.buffers['ubo'][1], 0, mffi.sizeof(self.ubo[0]), 0)
+            mffi.memmove(uboPtr, self.ubo, mffi.sizeof(self.ubo[0]))
+            vkUnmapMemory(self.device, self.buffers['ubo'][1])
+            self.write('pairs', batch)
+            self.write('hits', np.zeros(1, dtype=np.uint32))
+
+            vkBeginCommandBuffer(self.cmdBuffer, VkCommandBufferBeginInfo(
+                flags=VK_COMMAND_BUFFER_USAGE_ONE_TIME_SUBMIT_BIT
+            ))
+            vkCmdBindPipeline(self.cmdBuffer, VK_PIPELINE_BIND_POINT_COMPUTE, self.pipeline)
+            vkCmdBindDescriptorSets(self.cmdBuffer, VK_PIPELINE_BIND_POINT_COMPUTE, self.pipelineLayout,
+                                    0, 1, [self.descriptorSet,], 0, None)
+            vkCmdDispatch(self.cmdBuffer, (len(batch) + WORKGROUP_SIZE - 1) // WORKGROUP_SIZE, 1, 1)
+            vkEndCommandBuffer(self.cmdBuffer)
+            vkQueueSubmit(self.queue, 1, VkSubmitInfo(
+                waitSemaphoreCount=0,
+                pCommandBuffers=[self.cmdBuffer,],
+                signalSemaphoreCount=0
+            ), None)
+            vkQueueWaitIdle(self.queue)
+
+            numHits = np.zeros(1, dtype=np.uint32)
+            self.read('hits', numHits)
+            hits = np.zeros(int(numHits[0]), dtype=np.uint32)
+            if len(hits):
+                self.read('hits', hits, 4)
+            hit[start + hits.astype(np.int64)] = True
+        return hit
+
+    def destroy(self):
+        """Free everything on the device."""
+        for name in list(self.buffers):
+            self.destroyBuffer(name)
+        vkDestroyShaderModule(self.device, self.shaderModule, None)
+        vkDestroyCommandPool(self.device, self.commandPool, None)
+        vkDestroyDescriptorSetLayout(self.device, self.descriptorSetLayout, None)
+        vkDestroyDescriptorPool(self.device, self.descriptorPool, None)
+        vkDestroyPipelineLayout(self.device, self.pipelineLayout, None)
+        vkDestroyPipeline(self.device, self.pipeline, None)
+        vkDestroyDevice(self.device, None)
+        vkDestroyInstance(self.instance, None)
+        self.data = None
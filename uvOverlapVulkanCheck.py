@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Mack Stone
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+# Compare the Vulkan narrow phase of uvOverlapVulkan.py with
+# uvOverlap.checkCrossingEdgesBatch on the uvOverlapBench.py layouts, pair by
+# pair. Run it after rebuilding plugins/uvOverlapNarrow.spv, no Maya needed.
+#
+# how to use:
+#
+# VK_ICD_FILENAMES=/usr/share/vulkan/icd.d/lvp_icd.x86_64.json \
+#     python uvOverlapVulkanCheck.py --device llvmpipe
+# python uvOverlapVulkanCheck.py --layouts stacked --sizes 1000 100000
+#
+# exits with 1 if any pair differs
+
+import sys
+import time
+import argparse
+
+import numpy as np
+
+import uvOverlap
+import uvOverlapBench
+import uvOverlapVulkan
+
+SIZES = (1000, 10000, 100000)
+
+COLUMNS = ('layout', 'faces', 'candidates', 'cpu', 'vulkan', 'cpuHits', 'vulkanHits',
+           'mismatches')
+
+def compareMesh(narrowPhase, mesh):
+    """Run both narrow phases on the candidate pairs of mesh.
+
+    return dict of seconds per narrow phase, hit counts and the number of
+    pairs they disagree on"""
+    data = uvOverlap.extractUVFaceData(mesh)
+    center, radius = uvOverlap.createBoundingCircle(data)
+    valid = uvOverlap.overlapCandidateFaces(data, radius)[0]
+    pairI, pairJ = uvOverlap.findCandidatePairs(center, radius, valid)
+    rays = uvOverlap.createRays(data)
+    report = {'faces': data.numFaces, 'candidates': len(pairI)}
+
+    start = time.perf_counter()
+    cpuHit = uvOverlap.checkCrossingEdgesBatch(data, pairI, pairJ, rays)
+    report['cpu'] = time.perf_counter() - start
+    start = time.perf_counter()
+    vulkanHit = narrowPhase(data, pairI, pairJ, rays)
+    report['vulkan'] = time.perf_counter() - start
+
+    report['cpuHits'] = int(cpuHit.sum())
+    report['vulkanHits'] = int(vulkanHit.sum())
+    report['mismatches'] = int((cpuHit != vulkanHit).sum())
+    return report
+
+def runCheck(deviceName=None, layouts=None, sizes=SIZES, seed=0, out=None):
+    """Compare both narrow phases on every layout at every size, print a
+    table to out(stdout).
+
+    return list of report dicts"""
+    out = out or sys.stdout
+    reports = []
+    out.write(''.join('%12s' % col for col in COLUMNS) + '\n')
+    with uvOverlapVulkan.VulkanNarrowPhase(deviceName) as narrowPhase:
+        for layout in layouts or sorted(uvOverlapBench.LAYOUTS):
+            for size in sizes:
+                report = compareMesh(narrowPhase, uvOverlapBench.LAYOUTS[layout](size, seed))
+                report['layout'] = layout
+                reports.append(report)
+                row = []
+                for col in COLUMNS:
+                    value = report[col]
+                    row.append('%12.3f' % value if isinstance(value, float) else '%12s' % value)
+                out.write(''.join(row) + '\n')
+                out.flush()
+    return reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare the Vulkan narrow phase with the CPU one on synthetic uv layouts.')
+    parser.add_argument('--device', help="use the first device whose name holds this, e.g. 'llvmpipe'")
+    parser.add_argument('--layouts', nargs='+', choices=sorted(uvOverlapBench.LAYOUTS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    reports = runCheck(args.device, args.layouts, args.sizes, args.seed)
+    return 1 if any(report['mismatches'] for report in reports) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Mack Stone
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+# Pack uv shells into udim tiles, using the shells and uvs uvOverlap.py
+# extracts. Shell boxes are packed with a skyline, one height per texel
+# column of a tile, tallest shells first.
+#
+# how to use:
+#
+# from maya import cmds
+# import uvPacker
+#
+# # repack every udim tile on its own, shells stay in their tile
+# uvPacker.packUVs('pSphere1')
+#
+# # pack all shells into tiles 1001 and 1002
+# uvPacker.packUVs('pSphere1', udims=[1001, 1002], padding=0.002)
+#
+# MFnMesh.setUVs called from a script isn't undoable, keep the returned uvs
+# of a first packUVData call around to restore them
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import uvOverlap
+
+# texel columns of the skyline of one tile
+PACK_RESOLUTION = 1024
+# space between shells, in uv units
+PACK_PADDING = 0.004
+# share of the tiles the skyline is expected to fill
+PACK_FILL = 0.9
+# shrink the shells by this much each time they don't fit
+PACK_SHRINK = 0.97
+PACK_ATTEMPTS = 60
+
+
+def shellBoxes(data, shells=None):
+    """Return (uv shell of every uv, -1 if unused, shell box lo (n, 2),
+    shell box hi (n, 2)), taken from the uvs of every shell's faces."""
+    if shells is None:
+        shells = uvOverlap.computeUVShells(data)
+    shellOf, numShells = shells
+    uvShell = np.full(len(data.u), -1, dtype=np.int64)
+    uvShell[data.uvIds] = np.repeat(shellOf, data.counts)
+    used = np.flatnonzero(uvShell >= 0)
+    lo = np.full((numShells, 2), np.inf)
+    hi = np.full((numShells, 2), -np.inf)
+    for axis, values in enumerate((data.u, data.v)):
+        np.minimum.at(lo[:, axis], uvShell[used], values[used])
+        np.maximum.at(hi[:, axis], uvShell[used], values[used])
+    return uvShell, lo, hi
+
+def udimOrigin(udim):
+    """Return (u, v) of the lower left corner of udim tiles."""
+    udim = np.asarray(udim, dtype=np.int64) - 1001
+    return udim % 10, udim // 10
+
+def skylinePack(width, height, numTiles, resolution=PACK_RESOLUTION):
+    """Place boxes of width x height texels into numTiles square tiles of
+    resolution texels, tallest first, each at the lowest spot of the
+    skyline of the first tile it fits in.
+
+    return (x, y, tile) texel positions of the boxes, None if they don't fit"""
+    width = np.asarray(width, dtype=np.int64)
+    height = np.asarray(height, dtype=np.int64)
+    if len(width) and (width.max() > resolution or height.max() > resolution):
+        return None
+    x = np.zeros(len(width), dtype=np.int64)
+    y = np.zeros(len(width), dtype=np.int64)
+    tile = np.zeros(len(width), dtype=np.int64)
+    sky = np.zeros((numTiles, resolution), dtype=np.int64)
+    # lowest column of each tile, taller boxes can't go there
+    floor = np.zeros(numTiles, dtype=np.int64)
+    for k in np.lexsort((-width, -height)).tolist():
+        w = width[k]
+        h = height[k]
+        for t in np.flatnonzero(floor + h <= resolution).tolist():
+            tops = sliding_window_view(sky[t], w).max(axis=1)
+            pos = int(tops.argmin())
+            if tops[pos] + h <= resolution:
+                break
+        else:
+            return None
+        x[k] = pos
+        y[k] = tops[pos]
+        tile[k] = t
+        sky[t, pos:pos + w] = tops[pos] + h
+        floor[t] = sky[t].min()
+    return x, y, tile
+
+def packShells(shellLo, shellHi, udims, padding=PACK_PADDING,
+               resolution=PACK_RESOLUTION, rotate=False):
+    """Fit shell boxes into the given udim tiles, all scaled alike. The scale
+    starts where the boxes' texels fill PACK_FILL of the tiles and shrinks
+    until skylinePack finds room for all of them.
+    rotate - turn shells taller than wide by 90 degrees
+
+    return (scale, u, v offset of the packed boxes' lower left corner,
+    rotated) or None if they don't fit"""
+    size = shellHi - shellLo
+    rotated = (size[:, 1] > size[:, 0]) if rotate else np.zeros(len(size), dtype=bool)
+    size = np.where(rotated[:, None], size[:, ::-1], size)
+    # boxes hold half the padding on every side
+    texels = lambda scale: np.ceil((size * scale + padding) * resolution).astype(np.int64)
+    area = ((size[:, 0] + padding) * (size[:, 1] + padding)).sum()
+    scale = np.sqrt(len(udims) / max(area, 1e-12))
+    # boxes round up to whole texels, settle the scale on their texel area
+    target = PACK_FILL * len(udims) * resolution * resolution
+    for step in range(4):
+        cells = texels(scale).prod(axis=1).sum()
+        scale *= np.sqrt(target / max(cells, 1))
+    scale = min(scale, (1. - padding) / max(size.max() if len(size) else 1., 1e-12))
+    for attempt in range(PACK_ATTEMPTS):
+        width, height = texels(scale).T
+        placed = skylinePack(np.maximum(width, 1), np.maximum(height, 1), len(udims),
+                             resolution)
+        if placed is not None:
+            x, y, tile = placed
+            tileU, tileV = udimOrigin(np.asarray(udims)[tile])
+            offset = np.column_stack((tileU + (x + .5 * padding * resolution) / resolution,
+                                      tileV + (y + .5 * padding * resolution) / resolution))
+            return scale, offset, rotated
+        scale *= PACK_SHRINK
+    return None
+
+def packUVData(data, udims=None, padding=PACK_PADDING, resolution=PACK_RESOLUTION,
+               rotate=False):
+    """Pack the shells of a UVFaceData.
+    udims - tiles to fill in order, None to repack every udim tile on its
+    own with the shells whose box center lies in it
+
+    return packed (u, v) of all uvs, unused uvs stay in place"""
+    uvShell, lo, hi = shellBoxes(data)
+    u = data.u.astype(np.float64)
+    v = data.v.astype(np.float64)
+    if udims is None:
+        center = (lo + hi) * .5
+        tu = np.floor(center[:, 0])
+        tv = np.floor(center[:, 1])
+        inside = (tu >= 0) & (tu < 10) & (tv >= 0)
+        shellUdim = np.where(inside, 1001 + tu + 10 * tv, 1001).astype(np.int64)
+        groups = [(np.flatnonzero(shellUdim == udim), [udim])
+                  for udim in np.unique(shellUdim).tolist()]
+    else:
+        groups = [(np.arange(len(lo)), list(udims))]
+
+    scale = np.zeros(len(lo))
+    offset = np.zeros((len(lo), 2))
+    rotated = np.zeros(len(lo), dtype=bool)
+    for shells, tiles in groups:
+        packed = packShells(lo[shells], hi[shells], tiles, padding, resolution, rotate)
+        if packed is None:
+            raise RuntimeError("Can't fit %d shells into udims %s" % (len(shells), tiles))
+        scale[shells], offset[shells], rotated[shells] = packed
+
+    # move every uv with its shell, turned 90 degrees ccw if rotated
+    used = np.flatnonzero(uvShell >= 0)
+    s = uvShell[used]
+    du = u[used] - lo[s, 0]
+    dv = v[used] - lo[s, 1]
+    rot = rotated[s]
+    x = np.where(rot, hi[s, 1] - lo[s, 1] - dv, du)
+    y = np.where(rot, du, dv)
+    u[used] = offset[s, 0] + x * scale[s]
+    v[used] = offset[s, 1] + y * scale[s]
+    return u, v
+
+def packUVs(meshName, udims=None, padding=PACK_PADDING, resolution=PACK_RESOLUTION,
+            rotate=False, uvSet=''):
+    """Pack uv shells of meshName and write them back with one setUVs call,
+    see packUVData.
+
+    return packed (u, v)"""
+    meshfn = uvOverlap.getMeshFn(meshName)
+    data = uvOverlap.extractUVFaceData(meshfn, uvSet)
+    u, v = packUVData(data, udims, padding, resolution, rotate)
+    meshfn.setUVs(u.tolist(), v.tolist(), uvSet)
+    return u, v